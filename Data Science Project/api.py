@@ -3,16 +3,48 @@ UK Border Anomaly Detection - REST API
 Real-time ML prediction service for border security screening
 """
 
-from fastapi import FastAPI, HTTPException, status
+# OpenMP and BLAS size their thread pools when numpy and the model libraries
+# load, so the layout is applied before anything imports them
+from thread_layout import ThreadLayout
+THREAD_LAYOUT = ThreadLayout.from_env()
+THREAD_LAYOUT.configure_native_threads()
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, validator
+from typing import Any, Optional, List, Dict, Literal
 import joblib
 import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
 import os
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+import columnar
+import metrics
+from batching import MicroBatcher
+from audit_log import AuditLog
+from cascade import CascadeScorer
+from coalescing import SingleFlight
+from feature_store import AGGREGATE_INPUTS, FeatureStore
+from features import FeatureEncoder, calendar_features, passenger_columns
+from inference_pool import InferencePool
+from jobs import JobManager
+from model_registry import ModelRegistry
+from passenger_history import HISTORY_FIELDS, ArrivalRecorder, PassengerHistory
+from prediction_cache import PredictionCache
+from scoring import RISK_LEVELS, ScoreResult, make_scorer
+from streaming import DuplexStreamingResponse, ndjson_batches, ndjson_lines
+from synthetic import synthetic_passengers
+from tree_compiler import ARTIFACT_META, CompiledForest
+from tree_shap import explainer_for
 
 # Configure logging
 logging.basicConfig(
@@ -39,27 +71,191 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and per-stage timings, served at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Load models
 MODEL_PATH = "models/"
-MODELS = {}
+MODELS = {}  # name -> ModelScorer
+metrics.register_models(MODELS)
+
+# Per-model settings: pickle file, /predict micro-batching limits, and the
+# compiled tree artifact (see tree_compiler.py). Batches of up to
+# compiled_max_rows use the compiled arrays; None uses them for every batch
+# and skips loading the pickle.
+MODEL_CONFIG = {
+    'ensemble': {'file': 'ensemble_model.pkl', 'max_batch_size': 32, 'max_wait_ms': 2.0},
+    'xgboost': {
+        'file': 'xgboost_model.pkl', 'max_batch_size': 64, 'max_wait_ms': 2.0,
+        'compiled': 'xgboost_model.arrays', 'compiled_max_rows': 512
+    },
+    'random_forest': {
+        'file': 'random_forest_model.pkl', 'max_batch_size': 32, 'max_wait_ms': 2.0,
+        'compiled': 'random_forest_model.arrays', 'compiled_max_rows': 512
+    },
+    'isolation_forest': {
+        'file': 'isolation_forest_model.pkl', 'max_batch_size': 64, 'max_wait_ms': 1.0,
+        'compiled': 'isolation_forest_model.arrays', 'compiled_max_rows': 1024
+    }
+}
+
+# Cascade mode ('cascade' model): the cheap first stage decides passengers
+# scoring at or below `low` or at or above `high`; the band in between is
+# re-scored by the final stage. Tune the thresholds with `python cascade.py`.
+CASCADE_CONFIG = {
+    'first_stage': os.environ.get('CASCADE_FIRST_STAGE', 'xgboost'),
+    'final_stage': os.environ.get('CASCADE_FINAL_STAGE', 'ensemble'),
+    'low': float(os.environ.get('CASCADE_LOW', 0.02)),
+    'high': float(os.environ.get('CASCADE_HIGH', 0.98)),
+    'max_batch_size': 32,
+    'max_wait_ms': 2.0
+}
+
+# Per-country and per-airport aggregates, built by `python feature_store.py`
+FEATURE_STORE_PATH = os.path.join(MODEL_PATH, 'aggregate_features.npz')
+FEATURE_STORE = FeatureStore(record_increments=True)
+
+# Prediction audit trail (needs pyarrow; AUDIT_LOG=0 disables it), started at startup
+AUDIT_LOG_ENABLED = os.environ.get('AUDIT_LOG', '1').lower() not in ('0', 'false', 'no')
+AUDIT_LOG = None
+
+def audit_results(endpoint: str, model_name: str, results: List[Dict]):
+    """
+    Queue audit records for prediction dicts (error entries are skipped)
+    
+    Only appends to the in-memory audit queue; the audit writer thread
+    does the disk I/O.
+    """
+    if AUDIT_LOG is None:
+        return
+    scored = [result for result in results if result.get('error') is None]
+    scorer = MODELS.get(model_name)
+    AUDIT_LOG.record(
+        endpoint, model_name, scorer.version if scorer is not None else None,
+        [result['timestamp'] for result in scored], [result['passenger_id'] for result in scored],
+        [result['is_anomaly'] for result in scored], [result['anomaly_score'] for result in scored],
+        [result['risk_level'] for result in scored]
+    )
+
+# Passenger history index filling omitted behavioural fields; scored
+# arrivals are recorded into it in the background unless
+# PASSENGER_HISTORY_RECORD=0 (set it for benchmarks and synthetic load)
+PASSENGER_HISTORY_DB = os.environ.get('PASSENGER_HISTORY_DB', 'data/passenger_history.sqlite3')
+RECORD_ARRIVALS = os.environ.get('PASSENGER_HISTORY_RECORD', '1').lower() not in ('0', 'false', 'no')
+PASSENGER_HISTORY = None
+ARRIVAL_RECORDER = None
+
+def get_passenger_history() -> PassengerHistory:
+    """Return the passenger history index, opening it on first use"""
+    global PASSENGER_HISTORY
+    if PASSENGER_HISTORY is None:
+        PASSENGER_HISTORY = PassengerHistory(PASSENGER_HISTORY_DB)
+    return PASSENGER_HISTORY
+
+def get_arrival_recorder() -> ArrivalRecorder:
+    """Return this process's background arrival writer, creating it on first use"""
+    global ARRIVAL_RECORDER
+    if ARRIVAL_RECORDER is None:
+        ARRIVAL_RECORDER = ArrivalRecorder(get_passenger_history())
+    return ARRIVAL_RECORDER
+
+# Build TreeSHAP path statistics for tree models at load time (EXPLANATIONS=0 disables
+# explain=true), and return the largest EXPLAIN_TOP_FEATURES contributions (0 for all)
+EXPLANATIONS_ENABLED = os.environ.get('EXPLANATIONS', '1').lower() not in ('0', 'false', 'no')
+EXPLAIN_TOP_FEATURES = int(os.environ.get('EXPLAIN_TOP_FEATURES', 10))
+
+# Serve compiled models from their memory-mapped artifacts only, so every
+# worker on a host shares one copy through the page cache
+COMPILED_MODELS_ONLY = os.environ.get('COMPILED_MODELS_ONLY', '').lower() in ('1', 'true', 'yes')
+
+# Recent per-passenger results, so unchanged re-screenings skip the model
+PREDICTION_CACHE = PredictionCache.from_env()
+
+def artifact_version(path: str) -> str:
+    """Version tag for a model artifact, changing whenever the file is replaced"""
+    if os.path.isdir(path):
+        path = os.path.join(path, ARTIFACT_META)
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def _artifact_paths(name: str):
+    """Pickle path and compiled artifact path (or None) for a configured model"""
+    config = MODEL_CONFIG[name]
+    path = os.path.join(MODEL_PATH, config['file'])
+    compiled_path = os.path.join(MODEL_PATH, config['compiled']) if config.get('compiled') else None
+    if compiled_path is not None and not os.path.isdir(compiled_path):
+        compiled_path = None
+    return path, compiled_path
+
+def _compiled_only(name: str) -> bool:
+    return COMPILED_MODELS_ONLY or MODEL_CONFIG[name].get('compiled_max_rows') is None
+
+def model_version(name: str) -> Optional[str]:
+    """Version of the artifacts load_model would load for a model, or None if missing"""
+    path, compiled_path = _artifact_paths(name)
+    if compiled_path is not None and _compiled_only(name):
+        return artifact_version(compiled_path)
+    if not os.path.exists(path):
+        return None
+    if compiled_path is not None:
+        return f"{artifact_version(path)}+{artifact_version(compiled_path)}"
+    return artifact_version(path)
+
+def load_model(name: str):
+    """
+    Load one configured model and wrap it in a single-pass scorer
+    
+    Args:
+        name: Key into MODEL_CONFIG
+        
+    Returns:
+        ModelScorer, or None if the model file is missing
+    """
+    config = MODEL_CONFIG[name]
+    path, compiled_path = _artifact_paths(name)
+    version = model_version(name)
+    
+    compiled = None
+    if compiled_path is not None:
+        # Read-only memory map: loading is near-instant and pages are shared
+        compiled = CompiledForest.load(compiled_path, mmap=True)
+    
+    if compiled is not None and _compiled_only(name):
+        model, compiled = compiled, None
+    elif os.path.exists(path):
+        # Uncompressed joblib dumps map their numpy arrays instead of copying them
+        model = joblib.load(path, mmap_mode='r')
+        THREAD_LAYOUT.apply_to_model(model)
+    else:
+        logger.warning(f"Model file not found: {path}")
+        return None
+    
+    scorer = make_scorer(name, model, config, compiled=compiled, version=version)
+    if EXPLANATIONS_ENABLED:
+        scorer.explainer = explainer_for(compiled if compiled is not None else model)
+    return scorer
 
 def load_models():
-    """Load all trained models"""
+    """Load all trained models and wrap them in single-pass scorers"""
     try:
-        model_files = {
-            'ensemble': 'ensemble_model.pkl',
-            'xgboost': 'xgboost_model.pkl',
-            'random_forest': 'random_forest_model.pkl',
-            'isolation_forest': 'isolation_forest_model.pkl'
-        }
+        # Cached results belong to the models being replaced
+        PREDICTION_CACHE.clear()
+        for name in MODEL_CONFIG:
+            scorer = load_model(name)
+            if scorer is None:
+                continue
+            
+            MODEL_REGISTRY.publish(name, scorer)
+            logger.info(f"Loaded {name} model successfully ({scorer.model_type}, version {scorer.version})")
         
-        for name, filename in model_files.items():
-            path = os.path.join(MODEL_PATH, filename)
-            if os.path.exists(path):
-                MODELS[name] = joblib.load(path)
-                logger.info(f"Loaded {name} model successfully")
-            else:
-                logger.warning(f"Model file not found: {path}")
+        stages = (CASCADE_CONFIG['first_stage'], CASCADE_CONFIG['final_stage'])
+        if all(stage in MODELS for stage in stages):
+            MODELS['cascade'] = CascadeScorer(
+                'cascade', MODELS, *stages,
+                low=CASCADE_CONFIG['low'], high=CASCADE_CONFIG['high'], config=CASCADE_CONFIG
+            )
+            logger.info(f"Cascade enabled: {stages[0]} -> {stages[1]} "
+                        f"(early exit at <= {CASCADE_CONFIG['low']} or >= {CASCADE_CONFIG['high']})")
         
         if not MODELS:
             logger.error("No models loaded!")
@@ -82,12 +278,12 @@ class PassengerData(BaseModel):
     # Travel details
     origin_country: str = Field(..., description="Country of origin")
     booking_lead_days: int = Field(..., ge=0, le=365, description="Days between booking and travel")
-    ticket_type: str = Field(..., description="one_way, return, or multi_city")
+    ticket_type: Literal["one_way", "return", "multi_city"] = Field(..., description="one_way, return, or multi_city")
     
-    # Behavioral features
-    previous_visits: int = Field(..., ge=0, description="Number of previous UK visits")
-    travel_frequency: float = Field(..., ge=0, description="Visits per year")
-    previous_overstays: int = Field(0, ge=0, description="Number of previous overstays")
+    # Behavioral features (looked up in the passenger history index when omitted)
+    previous_visits: Optional[int] = Field(None, ge=0, description="Number of previous UK visits")
+    travel_frequency: Optional[float] = Field(None, ge=0, description="Visits per year")
+    previous_overstays: Optional[int] = Field(None, ge=0, description="Number of previous overstays")
     
     # Risk indicators
     high_risk_country: bool = Field(False, description="From high-risk country")
@@ -95,12 +291,13 @@ class PassengerData(BaseModel):
     
     # Optional
     age: Optional[int] = Field(None, ge=0, le=120, description="Passenger age")
-    gender: Optional[str] = Field(None, description="M, F, or Other")
+    gender: Optional[Literal["M", "F", "Other"]] = Field(None, description="M, F, or Other")
     
     @validator('arrival_date')
     def validate_date(cls, v):
         try:
-            datetime.strptime(v, '%Y-%m-%d')
+            # Cached, so the feature encoder reuses this parse
+            calendar_features(v)
             return v
         except ValueError:
             raise ValueError('Date must be in YYYY-MM-DD format')
@@ -137,6 +334,39 @@ class PredictionResponse(BaseModel):
     recommendations: List[str]
     feature_importance: Optional[Dict[str, float]] = None
 
+class FlightManifest(BaseModel):
+    """Passengers of one flight, with the flight's details given once"""
+    flight_number: str = Field(..., description="Flight identifier (e.g. BA178)")
+    arrival_port: str = Field(..., description="Airport code (e.g., LHR, LGW, MAN)")
+    arrival_date: str = Field(..., description="Date in YYYY-MM-DD format")
+    origin_country: Optional[str] = Field(None, description="Country of departure, for passengers without their own")
+    passengers: List[Dict[str, Any]] = Field(
+        ..., description="PassengerData objects; arrival_port, arrival_date and origin_country default to the flight's"
+    )
+    
+    @validator('arrival_date')
+    def validate_date(cls, v):
+        try:
+            calendar_features(v)
+            return v
+        except ValueError:
+            raise ValueError('Date must be in YYYY-MM-DD format')
+
+class ComparisonResponse(BaseModel):
+    """Scores of one passenger from several models"""
+    passenger_id: str
+    predictions: Dict[str, PredictionResponse]
+    errors: Dict[str, str] = {}
+    models_flagging: int
+    timestamp: str
+
+class JobRequest(BaseModel):
+    """Bulk scoring job for a passenger file on the server"""
+    input_path: str = Field(..., description="CSV or Parquet file with PassengerData columns")
+    model_name: str = Field("ensemble", description="Model to score with")
+    chunk_size: int = Field(50000, ge=1, le=1000000, description="Rows per chunk and result part")
+    record_arrivals: bool = Field(False, description="Add scored arrivals to the passenger history")
+
 # Health check
 @app.get("/", tags=["Health"])
 async def root():
@@ -151,16 +381,95 @@ async def root():
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    """Detailed health check"""
+    """Detailed health check (liveness; see /ready for readiness)"""
     return {
         "status": "healthy" if MODELS else "unhealthy",
+        "ready": READINESS['status'] == 'ready',
         "models": list(MODELS.keys()),
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """
+    Readiness for load balancers: 200 once every model has been warmed up, 503 before
+    
+    Reports the cold (first call) and warm (median) latency measured for
+    each model and batch size during warm-up.
+    """
+    ready = READINESS['status'] == 'ready'
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={**READINESS, "timestamp": datetime.now().isoformat()}
+    )
+
+def complete_history(passengers: List[PassengerData]) -> List[PassengerData]:
+    """
+    Fill omitted behavioural fields from the passenger history index
+    
+    Only passengers missing previous_visits, travel_frequency or
+    previous_overstays are looked up (one query for the whole group);
+    values supplied by the caller are kept.
+    
+    Args:
+        passengers: Validated passenger records, updated in place
+        
+    Returns:
+        The same passengers
+    """
+    missing = [p for p in passengers if any(getattr(p, field) is None for field in HISTORY_FIELDS)]
+    if missing:
+        history = get_passenger_history().features(
+            [p.passenger_id for p in missing], [p.arrival_date for p in missing]
+        )
+        for passenger, values in zip(missing, history):
+            for field, value in zip(HISTORY_FIELDS, values):
+                if getattr(passenger, field) is None:
+                    setattr(passenger, field, value)
+    return passengers
+
+def complete_history_columns(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Column-wise complete_history for validated columnar input (nulls are filled)"""
+    missing = np.zeros(len(columns['passenger_id']), dtype=bool)
+    for field in HISTORY_FIELDS:
+        missing |= pd.isna(columns[field])
+    
+    completed = dict(columns)
+    for field in HISTORY_FIELDS:
+        completed[field] = np.array(columns[field], dtype=np.float64)
+    if missing.any():
+        rows = np.flatnonzero(missing)
+        history = np.array(get_passenger_history().features(
+            np.asarray(columns['passenger_id'])[rows].tolist(),
+            np.asarray(columns['arrival_date'])[rows].tolist()
+        ), dtype=np.float64)
+        for j, field in enumerate(HISTORY_FIELDS):
+            values = completed[field]
+            absent = np.isnan(values[rows])
+            values[rows[absent]] = history[absent, j]
+    
+    completed['previous_visits'] = completed['previous_visits'].astype(np.int64)
+    completed['previous_overstays'] = completed['previous_overstays'].astype(np.int64)
+    return completed
+
+def record_arrivals(passenger_ids: List[str], arrival_dates: List[str]):
+    """Queue scored arrivals for the history index (written off the request path)"""
+    if not RECORD_ARRIVALS or not passenger_ids:
+        return
+    try:
+        get_arrival_recorder().record(passenger_ids, arrival_dates)
+    except Exception as e:
+        logger.error(f"Recording arrivals in the passenger history failed: {str(e)}")
+
 # Feature engineering function
 def engineer_features(data: PassengerData) -> pd.DataFrame:
-    """Convert passenger data to model features"""
+    """
+    Convert passenger data to model features
+    
+    Reference implementation; serving uses features.FeatureEncoder, which is
+    checked against this function (python features.py).
+    """
+    complete_history([data])
     
     # Parse date
     arrival_date = datetime.strptime(data.arrival_date, '%Y-%m-%d')
@@ -188,17 +497,343 @@ def engineer_features(data: PassengerData) -> pd.DataFrame:
     
     return pd.DataFrame([features])
 
+# Shared encoder writing features into per-thread float32 buffers
+ENCODER = FeatureEncoder()
+
+# Follow-up actions for flagged passengers, in output order
+RECOMMENDATION_RULES = [
+    ('previous_overstays', lambda col: col > 0, "Review previous overstay history"),
+    ('booking_lead_days', lambda col: col < 7, "Investigate short booking lead time"),
+    ('high_risk_country', lambda col: col == 1, "Enhanced document verification required"),
+    ('cash_amount', lambda col: col > 10000, "Verify source of funds"),
+]
+
+# Every combination of rule flags mapped to its recommendation list
+_RECOMMENDATION_TABLE = [
+    ["Flag for secondary screening"] + [
+        message for bit, (_, _, message) in enumerate(RECOMMENDATION_RULES)
+        if code & (1 << bit)
+    ]
+    for code in range(1 << len(RECOMMENDATION_RULES))
+]
+
+def build_recommendations(columns: Dict[str, np.ndarray], is_anomaly: np.ndarray) -> List[List[str]]:
+    """
+    Generate screening recommendations for each passenger
+    
+    Args:
+        columns: Raw passenger fields as column arrays (see features.passenger_columns)
+        is_anomaly: Boolean anomaly flags aligned with the columns
+        
+    Returns:
+        One recommendation list per passenger
+    """
+    codes = np.zeros(len(is_anomaly), dtype=np.int64)
+    for bit, (column, rule, _) in enumerate(RECOMMENDATION_RULES):
+        codes |= rule(np.asarray(columns[column])).astype(np.int64) << bit
+    # -1 marks passengers that need no follow-up
+    codes = np.where(is_anomaly, codes, -1)
+    
+    return [
+        list(_RECOMMENDATION_TABLE[code]) if code >= 0 else ["Standard processing"]
+        for code in codes.tolist()
+    ]
+
+def score_columns(columns: Dict[str, np.ndarray], model_name: str):
+    """
+    Score passengers given as raw column arrays with a single model call
+    
+    Args:
+        columns: Raw passenger fields (see features.passenger_columns)
+        model_name: Key into MODELS
+        
+    Returns:
+        Tuple of (ScoreResult, recommendations per passenger)
+    """
+    n_rows = len(columns['booking_lead_days'])
+    with metrics.STAGE_SECONDS.time(stage='feature_engineering', model=model_name):
+        features = ENCODER.encode_columns(columns, out=ENCODER.scratch(n_rows))
+    
+    scores = score_features(features, model_name)
+    
+    with metrics.STAGE_SECONDS.time(stage='recommendations', model=model_name):
+        recommendations = build_recommendations(columns, scores.is_anomaly)
+    return scores, recommendations
+
+def explain_columns(columns: Dict[str, np.ndarray], model_name: str) -> List[Dict[str, float]]:
+    """
+    Per-passenger TreeSHAP feature contributions
+    
+    Positive values push towards an anomaly. Contributions are in the
+    model's raw output: anomaly probability (random forest), log-odds
+    (XGBoost) or negated path length (isolation forest).
+    
+    Args:
+        columns: Raw passenger fields (see features.passenger_columns)
+        model_name: Key into MODELS; the model must have an explainer
+        
+    Returns:
+        Largest EXPLAIN_TOP_FEATURES contributions per passenger
+    """
+    features = ENCODER.to_frame(ENCODER.encode_columns(columns))
+    with metrics.STAGE_SECONDS.time(stage='explanation', model=model_name):
+        return MODELS[model_name].explainer.explain(features, top=EXPLAIN_TOP_FEATURES or None)
+
+def require_explainer(model_name: str):
+    """Reject explain=true for models without a TreeSHAP explainer"""
+    if model_name in MODELS and MODELS[model_name].explainer is None:
+        explainable = [name for name, scorer in MODELS.items() if scorer.explainer is not None]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Explanations are not available for '{model_name}'. Choose from: {explainable}"
+        )
+
+def score_features(features: np.ndarray, model_name: str) -> ScoreResult:
+    """
+    Score an encoded feature matrix with one model (through the prediction cache)
+    
+    Args:
+        features: Feature matrix in FEATURE_COLUMNS order
+        model_name: Key into MODELS
+        
+    Returns:
+        ScoreResult with one entry per row
+    """
+    metrics.BATCH_SIZE.observe(len(features), model=model_name)
+    scorer = MODELS[model_name]
+    with metrics.STAGE_SECONDS.time(stage='inference', model=model_name):
+        if PREDICTION_CACHE.enabled:
+            scores = score_cached(scorer, features)
+        else:
+            scores = scorer.score(ENCODER.to_frame(features))
+    
+    levels, counts = np.unique(scores.risk_level, return_counts=True)
+    for level, count in zip(levels.tolist(), counts.tolist()):
+        metrics.PASSENGERS_SCORED.inc(count, model=model_name, risk_level=level)
+    return scores
+
+def score_cached(scorer, features: np.ndarray) -> ScoreResult:
+    """
+    Score a feature matrix, running the model only on rows not in PREDICTION_CACHE
+    
+    Args:
+        scorer: ModelScorer to use for cache misses
+        features: Encoded feature matrix
+        
+    Returns:
+        ScoreResult for every row, in input order
+    """
+    keys = PREDICTION_CACHE.keys(scorer.name, scorer.version, features)
+    cached = PREDICTION_CACHE.get_many(keys)
+    misses = [i for i, value in enumerate(cached) if value is None]
+    
+    if len(misses) == len(keys):
+        scores = scorer.score(ENCODER.to_frame(features))
+        PREDICTION_CACHE.put_many(keys, zip(*(field.tolist() for field in scores)))
+        return scores
+    
+    if misses:
+        fresh = scorer.score(ENCODER.to_frame(features[misses]))
+        rows = list(zip(*(field.tolist() for field in fresh)))
+        PREDICTION_CACHE.put_many([keys[i] for i in misses], rows)
+        for i, row in zip(misses, rows):
+            cached[i] = row
+    
+    is_anomaly, anomaly_score, confidence, risk_level = zip(*cached)
+    return ScoreResult(
+        is_anomaly=np.array(is_anomaly, dtype=bool),
+        anomaly_score=np.array(anomaly_score, dtype=np.float64),
+        confidence=np.array(confidence, dtype=np.float64),
+        risk_level=np.array(risk_level)
+    )
+
+def predict_passengers(passengers: List[PassengerData], model_name: str,
+                       explain: bool = False) -> List[PredictionResponse]:
+    """
+    Score a group of passengers with a single model call
+    
+    Args:
+        passengers: Validated passenger records
+        model_name: Key into MODELS
+        explain: Fill feature_importance with TreeSHAP contributions
+        
+    Returns:
+        One PredictionResponse per passenger, in input order
+    """
+    complete_history(passengers)
+    columns = passenger_columns(passengers)
+    columns['passenger_id'] = [p.passenger_id for p in passengers]
+    return [PredictionResponse(**result) for result in predict_columns(columns, model_name, explain)]
+
+def predict_columns(columns: Dict[str, np.ndarray], model_name: str,
+                    explain: bool = False) -> List[Dict]:
+    """
+    Score validated passenger columns with a single model call
+    
+    Behavioural fields left null are filled from the passenger history.
+    
+    Args:
+        columns: Passenger fields as column arrays, including passenger_id
+            (see columnar.validate_records or features.passenger_columns)
+        model_name: Key into MODELS
+        explain: Fill feature_importance with TreeSHAP contributions
+        
+    Returns:
+        One PredictionResponse-shaped dict per passenger, in input order
+    """
+    columns = complete_history_columns(columns)
+    scores, recommendations = score_columns(columns, model_name)
+    explanations = explain_columns(columns, model_name) if explain else [None] * len(recommendations)
+    timestamp = datetime.now().isoformat()
+    passenger_ids = list(columns['passenger_id'])
+    record_arrivals(passenger_ids, list(columns['arrival_date']))
+    
+    return [
+        {
+            "passenger_id": passenger_id,
+            "is_anomaly": flag,
+            "anomaly_score": score,
+            "risk_level": level,
+            "confidence": conf,
+            "model_used": model_name,
+            "timestamp": timestamp,
+            "recommendations": recs,
+            "feature_importance": importance
+        }
+        for passenger_id, flag, score, level, conf, recs, importance in zip(
+            passenger_ids, scores.is_anomaly.tolist(), scores.anomaly_score.tolist(),
+            scores.risk_level.tolist(), scores.confidence.tolist(), recommendations, explanations
+        )
+    ]
+
+def warm_up_scorer(scorer):
+    """
+    Score sample traffic through a newly loaded scorer before it serves requests
+    
+    Covers single-passenger and micro-batch sizes, plus the library-model
+    path for scorers with a compiled evaluator.
+    
+    Raises:
+        ValueError: If the scorer returns missing or non-finite scores
+    """
+    example = PassengerData(**PassengerData.Config.schema_extra['example'])
+    sizes = {1, scorer.config.get('max_batch_size', 32)}
+    if scorer.compiled is not None:
+        sizes.add(scorer.compiled_max_rows + 1)
+    
+    for n_rows in sorted(sizes):
+        scores = scorer.score(ENCODER.to_frame(ENCODER.encode_batch([example] * n_rows)))
+        if len(scores.anomaly_score) != n_rows or not np.isfinite(scores.anomaly_score).all():
+            raise ValueError(f"Warm-up of {scorer.name} version {scorer.version} "
+                             f"returned invalid scores for {n_rows} rows")
+    
+    if scorer.explainer is not None:
+        scorer.explainer.shap_values(ENCODER.to_frame(ENCODER.encode_batch([example])))
+
+# Served model versions; reloads are loaded and warmed up before the swap
+MODEL_REGISTRY = ModelRegistry(MODELS, load_model, warmup=warm_up_scorer, version_of=model_version)
+
+# Poll model artifacts for retrained versions every N seconds (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 0))
+RELOAD_WATCHER = None
+
+# Inference runs on a worker pool so the event loop only handles I/O
+INFERENCE_POOL = None
+
+def get_inference_pool() -> InferencePool:
+    """Return the shared inference pool, configured from the environment"""
+    global INFERENCE_POOL
+    if INFERENCE_POOL is None:
+        INFERENCE_POOL = InferencePool.from_env(
+            initializer=load_models,
+            max_workers=THREAD_LAYOUT.pool_workers if THREAD_LAYOUT.enabled else None
+        )
+    return INFERENCE_POOL
+
+async def reload_and_swap(model_names: List[str], force: bool = False) -> List[Dict]:
+    """
+    Hot-reload models without pausing traffic
+    
+    Each model is loaded and warmed up on a background thread while the
+    current version keeps serving, then swapped in. Process-pool workers
+    hold their own copies, so the pool is replaced: new calls start workers
+    that load the new versions, and the old pool shuts down once its
+    in-flight calls finish.
+    
+    Args:
+        model_names: Models to reload
+        force: Reload even if the artifact on disk has not changed
+        
+    Returns:
+        One outcome dict per model
+    """
+    global INFERENCE_POOL
+    loop = asyncio.get_running_loop()
+    results = []
+    for name in model_names:
+        try:
+            results.append(await loop.run_in_executor(None, MODEL_REGISTRY.reload, name, force))
+        except Exception as e:
+            logger.error(f"Reload of {name} failed, keeping the served version: {str(e)}")
+            results.append({"model": name, "status": "failed", "error": str(e)})
+    
+    if any(result["status"] == "reloaded" for result in results):
+        PREDICTION_CACHE.clear()
+        if INFERENCE_POOL is not None and INFERENCE_POOL.kind == 'process':
+            retired, INFERENCE_POOL = INFERENCE_POOL, None
+            await retired.drain()
+    return results
+
+async def watch_model_artifacts(interval: float):
+    """Reload models whose artifacts change on disk, checking every interval seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stale = await loop.run_in_executor(None, MODEL_REGISTRY.stale)
+            if stale:
+                logger.info(f"New model artifacts detected for {stale}, reloading")
+                await reload_and_swap(stale)
+        except Exception as e:
+            logger.error(f"Model artifact check failed: {str(e)}")
+
+# Micro-batching dispatchers for /predict, one per model
+DISPATCHERS = {}
+
+# Identical concurrent /predict payloads share one computation (PREDICT_COALESCING=0 disables)
+PREDICT_COALESCING = os.environ.get('PREDICT_COALESCING', '1').lower() not in ('0', 'false', 'no')
+PREDICT_FLIGHTS = SingleFlight('predict')
+
+def get_dispatcher(model_name: str, explain: bool = False) -> MicroBatcher:
+    """Return the /predict dispatcher for a model (explained or not), creating it on first use"""
+    key = f"{model_name}:explain" if explain else model_name
+    if key not in DISPATCHERS:
+        config = MODELS[model_name].config
+        DISPATCHERS[key] = MicroBatcher(
+            key,
+            lambda passengers: get_inference_pool().run(predict_passengers, passengers, model_name, explain),
+            max_batch_size=config.get('max_batch_size', 32),
+            max_wait_ms=config.get('max_wait_ms', 2.0),
+            max_in_flight=get_inference_pool().max_concurrency
+        )
+    return DISPATCHERS[key]
+
 # Prediction endpoint
 @app.post("/predict", response_model=PredictionResponse, tags=["Prediction"])
+@metrics.timed_endpoint
 async def predict_anomaly(
     passenger: PassengerData,
-    model_name: str = "ensemble"
+    model_name: str = "ensemble",
+    explain: bool = False
 ):
     """
     Predict if a passenger is an anomaly
     
-    - **model_name**: Model to use (ensemble, xgboost, random_forest, isolation_forest)
+    - **model_name**: Model to use (ensemble, xgboost, random_forest, isolation_forest, cascade)
+    - **explain**: Fill feature_importance with per-passenger TreeSHAP contributions (tree models)
     """
+    if explain:
+        require_explainer(model_name)
     try:
         # Validate model selection
         if model_name not in MODELS:
@@ -207,65 +842,21 @@ async def predict_anomaly(
                 detail=f"Model '{model_name}' not available. Choose from: {list(MODELS.keys())}"
             )
         
-        # Engineer features
-        features_df = engineer_features(passenger)
-        
-        # Get model
-        model = MODELS[model_name]
-        
-        # Make prediction
-        if hasattr(model, 'predict_proba'):
-            prediction = model.predict(features_df)[0]
-            probabilities = model.predict_proba(features_df)[0]
-            anomaly_score = probabilities[1] if len(probabilities) > 1 else probabilities[0]
-            confidence = max(probabilities)
+        # Concurrent requests for the same model share one vectorized call
+        dispatcher = get_dispatcher(model_name, explain)
+        if PREDICT_COALESCING:
+            # Keyed before scoring, which fills omitted history fields in place
+            key = (model_name, explain, json.dumps(passenger.dict(), sort_keys=True))
+            response = await PREDICT_FLIGHTS.run(key, lambda: dispatcher.submit(passenger))
         else:
-            # For unsupervised models
-            prediction = model.predict(features_df)[0]
-            anomaly_score = abs(model.score_samples(features_df)[0])
-            confidence = min(1.0, anomaly_score / 2)
-            prediction = -1 if prediction == -1 else 0  # Normalize to 0/1
+            response = await dispatcher.submit(passenger)
         
-        is_anomaly = bool(prediction == 1 or prediction == -1)
-        
-        # Determine risk level
-        if anomaly_score >= 0.8:
-            risk_level = "CRITICAL"
-        elif anomaly_score >= 0.6:
-            risk_level = "HIGH"
-        elif anomaly_score >= 0.4:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
-        
-        # Generate recommendations
-        recommendations = []
-        if is_anomaly:
-            recommendations.append("Flag for secondary screening")
-            if passenger.previous_overstays > 0:
-                recommendations.append("Review previous overstay history")
-            if passenger.booking_lead_days < 7:
-                recommendations.append("Investigate short booking lead time")
-            if passenger.high_risk_country:
-                recommendations.append("Enhanced document verification required")
-            if passenger.cash_amount > 10000:
-                recommendations.append("Verify source of funds")
-        else:
-            recommendations.append("Standard processing")
-        
-        # Build response
-        response = PredictionResponse(
-            passenger_id=passenger.passenger_id,
-            is_anomaly=is_anomaly,
-            anomaly_score=float(anomaly_score),
-            risk_level=risk_level,
-            confidence=float(confidence),
-            model_used=model_name,
-            timestamp=datetime.now().isoformat(),
-            recommendations=recommendations
-        )
-        
-        logger.info(f"Prediction for {passenger.passenger_id}: {risk_level} (score: {anomaly_score:.3f})")
+        # Queued for the audit writer instead of a synchronous log write
+        audit_results('/predict', model_name, [{
+            'timestamp': response.timestamp, 'passenger_id': response.passenger_id,
+            'is_anomaly': response.is_anomaly, 'anomaly_score': response.anomaly_score,
+            'risk_level': response.risk_level
+        }])
         
         return response
         
@@ -276,61 +867,848 @@ async def predict_anomaly(
             detail=f"Prediction failed: {str(e)}"
         )
 
+async def read_json_body(request: Request) -> Any:
+    """Decode a JSON request body (None if empty), rejecting malformed JSON as FastAPI does"""
+    body = await request.body()
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error",
+              "input": {}, "ctx": {"error": e.msg}}],
+            body=e.doc
+        )
+
+def validate_passenger_batch(records: Any, loc: tuple = ("body",)) -> Dict[str, np.ndarray]:
+    """
+    Validate a JSON array of passengers into feature-ready columns
+    
+    Well-formed rows are checked with column operations
+    (columnar.validate_records); only the rows those checks flag are run
+    through PassengerData, so the error report is the one FastAPI gives
+    for a List[PassengerData] body, and inputs pydantic coerces (such as
+    numeric strings) are still accepted.
+    
+    Args:
+        records: Decoded request body
+        loc: Location of the records in the request, prefixed to error locations
+        
+    Returns:
+        Passenger fields as column arrays
+        
+    Raises:
+        RequestValidationError: If any passenger is invalid (answered with 422)
+    """
+    if records is None:
+        raise RequestValidationError([{"type": "missing", "loc": loc, "msg": "Field required", "input": None}])
+    if not isinstance(records, list):
+        try:
+            TypeAdapter(List[PassengerData]).validate_python(records, from_attributes=True)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": (*loc, *error["loc"])} for error in e.errors(include_url=False)],
+                body=records
+            )
+    
+    columns, rejected = columnar.validate_records(records, PassengerData)
+    errors = []
+    for row in np.flatnonzero(rejected).tolist():
+        try:
+            passenger = PassengerData.model_validate(records[row], from_attributes=True)
+        except ValidationError as e:
+            errors.extend({**error, "loc": (*loc, row, *error["loc"])} for error in e.errors(include_url=False))
+            continue
+        for name, values in columns.items():
+            value = getattr(passenger, name)
+            values[row] = np.nan if value is None and values.dtype.kind == 'f' else value
+    if errors:
+        raise RequestValidationError(errors, body=records)
+    return columns
+
+# Request body schema for /predict/batch, which validates the raw JSON itself
+BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {
+            "type": "array", "items": {"$ref": "#/components/schemas/PassengerData"}
+        }}}
+    }
+}
+
 # Batch prediction endpoint
-@app.post("/predict/batch", tags=["Prediction"])
+@app.post("/predict/batch", tags=["Prediction"], openapi_extra=BATCH_REQUEST_BODY)
+@metrics.timed_endpoint
 async def predict_batch(
-    passengers: List[PassengerData],
-    model_name: str = "ensemble"
+    request: Request,
+    model_name: str = "ensemble",
+    explain: bool = False
 ):
     """
     Predict anomalies for multiple passengers
+    
+    The body is a JSON array of PassengerData objects, validated column by
+    column rather than one pydantic object per passenger; invalid
+    passengers are reported per field with a 422, as for the other
+    endpoints. The whole batch is scored with one feature build and one
+    model call. If that fails, passengers are re-scored one at a time so a
+    single bad record only affects its own result. With **explain**,
+    TreeSHAP contributions are computed for the whole batch in one pass.
     """
+    records = await read_json_body(request)
+    with metrics.STAGE_SECONDS.time(stage='validation', model=metrics.model_label(model_name)):
+        columns = validate_passenger_batch(records)
+    if explain:
+        require_explainer(model_name)
     results = []
     
+    try:
+        # Unknown models are reported per passenger by the fallback below
+        if model_name not in MODELS:
+            raise KeyError(model_name)
+        if records:
+            results = await get_inference_pool().run(predict_columns, columns, model_name, explain)
+            audit_results('/predict/batch', model_name, results)
+    except Exception as e:
+        logger.warning(f"Vectorized batch failed, falling back to per-passenger scoring: {str(e)}")
+        results = []
+        passengers = [PassengerData.model_validate(record) for record in records]
+        for passenger in passengers:
+            try:
+                result = await predict_anomaly(passenger, model_name, explain)
+                results.append(result.dict())
+            except Exception as e:
+                logger.error(f"Batch prediction error for {passenger.passenger_id}: {str(e)}")
+                results.append({
+                    "passenger_id": passenger.passenger_id,
+                    "error": str(e)
+                })
+    
+    return {
+        "total": len(records),
+        "processed": len(results),
+        "results": results,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def flight_summary(results: List[Dict]) -> Dict:
+    """
+    Flight-level view of a manifest's predictions
+    
+    Args:
+        results: Per-passenger prediction dicts
+        
+    Returns:
+        Counts by risk level, anomaly count and rate, score statistics, the
+        flight's highest risk level, flagged passengers (highest score
+        first) and how many flagged passengers each recommendation covers
+    """
+    scores = np.array([result["anomaly_score"] for result in results], dtype=np.float64)
+    flagged = sorted((result for result in results if result["is_anomaly"]),
+                     key=lambda result: result["anomaly_score"], reverse=True)
+    levels = Counter(result["risk_level"] for result in results)
+    recommendations = Counter(rec for result in flagged for rec in result["recommendations"])
+    
+    return {
+        "passengers": len(results),
+        "anomalies": len(flagged),
+        "anomaly_rate": len(flagged) / len(results) if results else 0.0,
+        "risk_level": max(levels, key=RISK_LEVELS.index) if results else None,
+        "risk_levels": {level: levels.get(level, 0) for level in reversed(RISK_LEVELS)},
+        "max_anomaly_score": float(scores.max()) if results else None,
+        "mean_anomaly_score": float(scores.mean()) if results else None,
+        "flagged_passengers": [result["passenger_id"] for result in flagged],
+        "recommendations": dict(recommendations.most_common())
+    }
+
+# Flight manifest endpoint
+@app.post("/predict/manifest", tags=["Prediction"])
+@metrics.timed_endpoint
+async def predict_manifest(
+    manifest: FlightManifest,
+    model_name: str = "ensemble",
+    explain: bool = False
+):
+    """
+    Score every passenger of a flight and summarise the flight
+    
+    The flight's arrival port, date and origin are given once and apply to
+    passengers that do not set their own. Context shared by the flight is
+    derived once: the arrival date's calendar features and the route's
+    per-country and per-airport aggregates. Passengers are validated column
+    by column and scored in one vectorized call; the response has the
+    per-passenger results and a flight-level risk summary.
+    """
+    if model_name not in MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{model_name}' not available. Choose from: {list(MODELS.keys())}"
+        )
+    if explain:
+        require_explainer(model_name)
+    
+    flight = {"arrival_port": manifest.arrival_port, "arrival_date": manifest.arrival_date}
+    if manifest.origin_country is not None:
+        flight["origin_country"] = manifest.origin_country
+    records = [{**flight, **passenger} for passenger in manifest.passengers]
+    with metrics.STAGE_SECONDS.time(stage='validation', model=model_name):
+        columns = validate_passenger_batch(records, loc=("body", "passengers"))
+    if records and (columns['arrival_date'] == manifest.arrival_date).all():
+        columns['calendar'] = np.array(calendar_features(manifest.arrival_date), dtype=np.int64)
+    
+    results = []
+    if records:
+        try:
+            results = await get_inference_pool().run(predict_columns, columns, model_name, explain)
+        except Exception as e:
+            logger.error(f"Manifest prediction error for flight {manifest.flight_number}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Prediction failed: {str(e)}"
+            )
+        audit_results('/predict/manifest', model_name, results)
+    
+    # Every value is already a JSON type, so the encoder pass over each result is skipped
+    return JSONResponse({
+        "flight": {
+            "flight_number": manifest.flight_number,
+            "arrival_port": manifest.arrival_port,
+            "arrival_date": manifest.arrival_date,
+            "origin_country": manifest.origin_country
+        },
+        "summary": flight_summary(results),
+        "aggregates": FEATURE_STORE.features_for(manifest.origin_country or "", manifest.arrival_port),
+        "results": results,
+        "timestamp": datetime.now().isoformat()
+    })
+
+# Multi-model comparison endpoint
+@app.post("/predict/compare", response_model=ComparisonResponse, tags=["Prediction"])
+@metrics.timed_endpoint
+async def predict_compare(
+    passenger: PassengerData,
+    models: Optional[List[str]] = Query(None, description="Models to compare (default: all loaded models)")
+):
+    """
+    Score one passenger with several models in one request
+    
+    The input is validated and its features are computed once; the models
+    then run in parallel on the inference pool. A failing model is reported
+    under `errors` without affecting the others.
+    """
+    model_names = models or list(MODELS.keys())
+    unknown = [name for name in model_names if name not in MODELS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Models {unknown} not available. Choose from: {list(MODELS.keys())}"
+        )
+    
+    columns = passenger_columns(complete_history([passenger]))
+    with metrics.STAGE_SECONDS.time(stage='feature_engineering', model='multiple'):
+        # Own buffer: it is read by several pool threads at once
+        features = ENCODER.encode_columns(columns)
+    
+    pool = get_inference_pool()
+    outcomes = await asyncio.gather(
+        *(pool.run(score_features, features, name) for name in model_names),
+        return_exceptions=True
+    )
+    
+    timestamp = datetime.now().isoformat()
+    predictions, errors = {}, {}
+    for name, scores in zip(model_names, outcomes):
+        if isinstance(scores, Exception):
+            logger.error(f"Comparison scoring failed for {name}: {str(scores)}")
+            errors[name] = str(scores)
+            continue
+        audit_results('/predict/compare', name, [{
+            'timestamp': timestamp, 'passenger_id': passenger.passenger_id, 'is_anomaly': bool(scores.is_anomaly[0]),
+            'anomaly_score': float(scores.anomaly_score[0]), 'risk_level': str(scores.risk_level[0])
+        }])
+        predictions[name] = PredictionResponse(
+            passenger_id=passenger.passenger_id,
+            is_anomaly=bool(scores.is_anomaly[0]),
+            anomaly_score=float(scores.anomaly_score[0]),
+            risk_level=str(scores.risk_level[0]),
+            confidence=float(scores.confidence[0]),
+            model_used=name,
+            timestamp=timestamp,
+            recommendations=build_recommendations(columns, scores.is_anomaly)[0]
+        )
+    
+    logger.info(f"Compared {len(predictions)} models for {passenger.passenger_id}")
+    return ComparisonResponse(
+        passenger_id=passenger.passenger_id,
+        predictions=predictions,
+        errors=errors,
+        models_flagging=sum(prediction.is_anomaly for prediction in predictions.values()),
+        timestamp=timestamp
+    )
+
+async def score_chunk(passengers: List[PassengerData], model_name: str) -> List[Dict]:
+    """
+    Score a chunk on the inference pool, isolating failures per passenger
+    
+    Args:
+        passengers: Validated passenger records
+        model_name: Key into MODELS
+        
+    Returns:
+        One prediction dict (or error dict) per passenger
+    """
+    pool = get_inference_pool()
+    try:
+        predictions = await pool.run(predict_passengers, passengers, model_name)
+        return [prediction.dict() for prediction in predictions]
+    except Exception as e:
+        logger.warning(f"Chunk of {len(passengers)} failed, scoring passengers individually: {str(e)}")
+    
+    results = []
     for passenger in passengers:
         try:
-            result = await predict_anomaly(passenger, model_name)
-            results.append(result.dict())
+            prediction = (await pool.run(predict_passengers, [passenger], model_name))[0]
+            results.append(prediction.dict())
         except Exception as e:
-            logger.error(f"Batch prediction error for {passenger.passenger_id}: {str(e)}")
-            results.append({
-                "passenger_id": passenger.passenger_id,
-                "error": str(e)
-            })
+            results.append({"passenger_id": passenger.passenger_id, "error": str(e)})
+    return results
+
+# Streaming prediction endpoint
+@app.post("/predict/stream", tags=["Prediction"])
+@metrics.timed_endpoint
+async def predict_stream(
+    request: Request,
+    model_name: str = "ensemble",
+    chunk_size: int = Query(1000, ge=1, le=10000, description="Maximum passengers scored per model call")
+):
+    """
+    Score an NDJSON stream of passengers and stream NDJSON results back
+    
+    The request body holds one PassengerData object per line. It is read and
+    scored chunk by chunk, so memory stays bounded for any input size and the
+    first results are sent before the upload finishes. Each output line
+    carries the input `line` number; invalid lines produce an `error` record
+    instead of a prediction.
+    """
+    if model_name not in MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{model_name}' not available. Choose from: {list(MODELS.keys())}"
+        )
     
+    async def results():
+        total = 0
+        async for batch in ndjson_batches(request.stream(), max_batch=chunk_size):
+            records = {}
+            passengers, lines = [], []
+            for line, obj in batch:
+                try:
+                    if isinstance(obj, Exception):
+                        raise obj
+                    passengers.append(PassengerData(**obj))
+                    lines.append(line)
+                except Exception as e:
+                    passenger_id = obj.get('passenger_id') if isinstance(obj, dict) else None
+                    records[line] = {"line": line, "passenger_id": passenger_id, "error": str(e)}
+            
+            if passengers:
+                scored = await score_chunk(passengers, model_name)
+                audit_results('/predict/stream', model_name, scored)
+                for line, result in zip(lines, scored):
+                    records[line] = {"line": line, **result}
+            
+            total += len(batch)
+            yield ndjson_lines([records[line] for line, _ in batch])
+        
+        logger.info(f"Streamed predictions for {total} passengers ({model_name})")
+    
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+def score_table(table, model_name: str, record: bool = True):
+    """
+    Validate and score a pyarrow table of passengers
+    
+    Decoding, validation and result assembly are all column operations,
+    and only valid rows reach the model.
+    
+    Args:
+        table: pyarrow.Table with PassengerData columns
+        model_name: Key into MODELS
+        record: Add the scored arrivals to the passenger history
+        
+    Returns:
+        Tuple of (result table aligned with the input rows, valid row count, total rows)
+    """
+    columns, valid, errors = columnar.validate_table(table, PassengerData)
+    
+    if valid.any():
+        scored = complete_history_columns({name: np.asarray(values)[valid] for name, values in columns.items()})
+        scores, recommendations = score_columns(scored, model_name)
+        if record:
+            record_arrivals(scored['passenger_id'].tolist(), list(scored['arrival_date']))
+    else:
+        scores, recommendations = columnar.empty_scores(), []
+    
+    results = columnar.results_table(
+        columns['passenger_id'], valid, errors, scores, recommendations,
+        model_name, datetime.now().isoformat()
+    )
+    return results, int(valid.sum()), len(valid)
+
+def predict_table(body: bytes, model_name: str):
+    """
+    Score an Arrow IPC or Parquet passenger table and re-encode the results
+    
+    Runs on the inference pool.
+    
+    Args:
+        body: Arrow IPC stream/file or Parquet bytes with PassengerData columns
+        model_name: Key into MODELS
+        
+    Returns:
+        Tuple of (encoded result table, format name, valid row count, total
+        rows, audit columns of the scored rows)
+    """
+    table, fmt = columnar.read_table(body)
+    results, n_valid, n_rows = score_table(table, model_name)
+    scored = results.filter(results.column('error').is_null())
+    audit_columns = scored.select(['timestamp', 'passenger_id', 'is_anomaly', 'anomaly_score', 'risk_level']).to_pydict()
+    return columnar.write_table(results, fmt), fmt, n_valid, n_rows, audit_columns
+
+# Columnar prediction endpoint
+@app.post("/predict/columnar", tags=["Prediction"])
+@metrics.timed_endpoint
+async def predict_columnar(request: Request, model_name: str = "ensemble"):
+    """
+    Score an Arrow IPC or Parquet table of passengers
+    
+    The body holds one column per PassengerData field. Rows are validated
+    with vectorized range checks instead of one pydantic object each, and
+    results come back in the same format, one row per input row. Rows that
+    fail validation have null scores and an `error` message.
+    """
+    if columnar.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Columnar input requires pyarrow to be installed"
+        )
+    if model_name not in MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{model_name}' not available. Choose from: {list(MODELS.keys())}"
+        )
+    
+    body = await request.body()
+    try:
+        content, fmt, n_valid, n_rows, audit_columns = await get_inference_pool().run(predict_table, body, model_name)
+    except columnar.ColumnarValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except columnar.pa.ArrowInvalid as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Body is not an Arrow IPC or Parquet table: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Columnar prediction error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Prediction failed: {str(e)}"
+        )
+    
+    if AUDIT_LOG is not None:
+        AUDIT_LOG.record('/predict/columnar', model_name, MODELS[model_name].version, audit_columns['timestamp'],
+                         audit_columns['passenger_id'], audit_columns['is_anomaly'],
+                         audit_columns['anomaly_score'], audit_columns['risk_level'])
+    logger.info(f"Columnar predictions for {n_valid}/{n_rows} passengers ({model_name}, {fmt})")
+    return Response(content=content, media_type=columnar.MEDIA_TYPES[fmt])
+
+# Bulk scoring jobs (chunks run on their own process pool)
+JOB_MANAGER = JobManager.from_env(score_table, initializer=load_models)
+
+def require_job_support(model_name: str):
+    """Reject job submissions that cannot run (no pyarrow or unknown model)"""
+    if columnar.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Bulk jobs require pyarrow to be installed"
+        )
+    if model_name not in MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{model_name}' not available. Choose from: {list(MODELS.keys())}"
+        )
+
+def job_status_or_404(job_id: str) -> Dict:
+    job = JOB_MANAGER.status(job_id) if os.path.basename(job_id) == job_id else None
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def submit_job(job: JobRequest):
+    """
+    Score a passenger file on the server in the background
+    
+    The file is split into chunks scored on a process pool; results are
+    written as Parquet parts under the job's `results_path`. Poll
+    `GET /jobs/{job_id}` for progress.
+    """
+    require_job_support(job.model_name)
+    if not os.path.isfile(job.input_path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Input file '{job.input_path}' not found"
+        )
+    
+    manifest = await JOB_MANAGER.submit(job.input_path, job.model_name, job.chunk_size, job.record_arrivals)
+    return JOB_MANAGER.status(manifest['job_id'])
+
+@app.post("/jobs/upload", status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def upload_job(request: Request, model_name: str = "ensemble", chunk_size: int = Query(50000, ge=1, le=1000000),
+                     record_arrivals: bool = False):
+    """
+    Upload a CSV or Parquet passenger file (raw request body) and score it as a job
+    
+    The body is streamed to the job directory, so large files are never
+    held in memory.
+    """
+    require_job_support(model_name)
+    
+    job_id = JOB_MANAGER.new_job_id()
+    job_dir = JOB_MANAGER.job_dir(job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    input_path = os.path.join(job_dir, 'input')
+    with open(input_path, 'wb') as f:
+        async for block in request.stream():
+            f.write(block)
+    
+    manifest = await JOB_MANAGER.submit(input_path, model_name, chunk_size, record_arrivals, job_id=job_id)
+    return JOB_MANAGER.status(manifest['job_id'])
+
+@app.get("/jobs", tags=["Jobs"])
+async def list_jobs():
+    """All jobs with their progress"""
     return {
-        "total": len(passengers),
-        "processed": len(results),
-        "results": results,
+        "jobs": [JOB_MANAGER.status(job_id) for job_id in JOB_MANAGER.job_ids()],
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """Progress of a job: rows done, completion, throughput and estimated time left"""
+    return job_status_or_404(job_id)
+
+@app.post("/jobs/{job_id}/resume", tags=["Jobs"])
+async def resume_job(job_id: str):
+    """Restart a failed or cancelled job; finished chunks are not scored again"""
+    job = job_status_or_404(job_id)
+    require_job_support(job['model_name'])
+    JOB_MANAGER.resume(job_id)
+    return JOB_MANAGER.status(job_id)
+
+@app.delete("/jobs/{job_id}", tags=["Jobs"])
+async def cancel_job(job_id: str):
+    """Stop a job, keeping the result parts written so far"""
+    job_status_or_404(job_id)
+    await JOB_MANAGER.cancel(job_id)
+    return JOB_MANAGER.status(job_id)
+
 # Model info endpoint
 @app.get("/models", tags=["Models"])
 async def list_models():
     """List available models and their details"""
     model_info = {}
     
-    for name, model in MODELS.items():
+    for name, scorer in MODELS.items():
         model_info[name] = {
             "name": name,
-            "type": type(model).__name__,
-            "loaded": True
+            "type": scorer.model_type,
+            "compiled_evaluator": scorer.compiled is not None or isinstance(scorer.model, CompiledForest),
+            "explainable": scorer.explainer is not None,
+            "loaded": True,
+            "version": scorer.version,
+            **MODEL_REGISTRY.info(name)
         }
     
     return {
         "available_models": model_info,
         "default_model": "ensemble",
+        "worker_pid": os.getpid(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/models/reload", tags=["Models"])
+async def reload_models(model_name: Optional[str] = None, force: bool = False):
+    """
+    Load, warm up and swap in the current model artifacts of this worker
+    
+    - **model_name**: Model to reload (default: all configured models)
+    - **force**: Reload even if the artifact on disk is unchanged
+    
+    Requests keep being served by the previous version until the swap.
+    """
+    if model_name is not None and model_name not in MODEL_CONFIG:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{model_name}' is not configured. Choose from: {list(MODEL_CONFIG.keys())}"
+        )
+    
+    results = await reload_and_swap([model_name] if model_name else list(MODEL_CONFIG), force)
+    return {
+        "results": results,
+        "worker_pid": os.getpid(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/batching", tags=["Models"])
+async def batching_stats():
+    """Queue depth and batch-size statistics of the /predict dispatchers"""
+    return {
+        "dispatchers": {name: dispatcher.stats() for name, dispatcher in DISPATCHERS.items()},
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/coalescing", tags=["Models"])
+async def coalescing_stats():
+    """How many concurrent identical /predict requests shared a computation"""
+    return {
+        "predict": PREDICT_FLIGHTS.stats(),
+        "enabled": PREDICT_COALESCING,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/threads", tags=["Models"])
+async def thread_stats():
+    """
+    Thread layout of the worker answering: CPU share, inference pool size,
+    per-model n_jobs, native thread pools and the OS thread count
+    """
+    return {
+        **THREAD_LAYOUT.describe(MODELS, get_inference_pool()),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/cache", tags=["Models"])
+async def cache_stats():
+    """Prediction cache size, hit rate and evictions (this process only)"""
+    return {
+        "cache": PREDICTION_CACHE.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/inference", tags=["Models"])
+async def inference_stats():
+    """Occupancy and utilization of the inference worker pool"""
+    return {
+        "pool": get_inference_pool().stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics", tags=["Models"])
+async def prometheus_metrics():
+    """Latency histograms per stage and model, batch sizes and request counts (Prometheus format)"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Aggregate feature endpoints
+@app.get("/stats/audit", tags=["Models"])
+async def audit_stats():
+    """Audit queue depth, records written and dropped, and flush latency"""
+    return {
+        "audit": AUDIT_LOG.stats() if AUDIT_LOG is not None else None,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/stats/history", tags=["Models"])
+async def history_stats():
+    """Passenger history index size and this worker's arrival recording queue"""
+    loop = asyncio.get_running_loop()
+    return {
+        "history": await loop.run_in_executor(None, get_passenger_history().stats),
+        "recording": ARRIVAL_RECORDER.stats() if ARRIVAL_RECORDER is not None else None,
+        "record_arrivals": RECORD_ARRIVALS,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/audit/{passenger_id}", tags=["Audit"])
+async def audit_history(passenger_id: str, limit: int = Query(100, ge=1, le=10000)):
+    """
+    Screening history of a passenger from the audit log, most recent first
+    
+    Records still queued in memory (up to AUDIT_FLUSH_INTERVAL seconds old)
+    are not included yet.
+    """
+    if AUDIT_LOG is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The audit log is disabled (AUDIT_LOG=0 or pyarrow not installed)"
+        )
+    loop = asyncio.get_running_loop()
+    records = await loop.run_in_executor(None, AUDIT_LOG.lookup, passenger_id, limit)
+    return {
+        "passenger_id": passenger_id,
+        "records": records,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/features/aggregates", tags=["Features"])
+async def aggregate_features(origin_country: str, arrival_port: str):
+    """
+    Per-country and per-airport aggregated features for one passenger
+    
+    Countries or airports never seen fall back to the aggregates over all arrivals.
+    """
+    return {
+        "origin_country": origin_country,
+        "arrival_port": arrival_port,
+        "features": FEATURE_STORE.features_for(origin_country, arrival_port),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/features/arrivals", tags=["Features"])
+async def ingest_arrivals(passengers: List[PassengerData]):
+    """Add confirmed arrivals to the running aggregates of this worker"""
+    if passengers:
+        complete_history(passengers)
+        FEATURE_STORE.update({
+            field: [getattr(passenger, field) for passenger in passengers] for field in AGGREGATE_INPUTS
+        })
+    return {
+        "ingested": len(passengers),
+        "store": FEATURE_STORE.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Startup warm-up: synthetic batches through every model before /ready reports ready
+WARMUP_ENABLED = os.environ.get('WARMUP', '1').lower() not in ('0', 'false', 'no')
+WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get('WARMUP_BATCH_SIZES', '1,32,256').split(',')]
+WARMUP_ROUNDS = int(os.environ.get('WARMUP_ROUNDS', 5))
+
+READINESS = {"status": "starting", "started_at": None, "finished_at": None, "warmup": {}, "error": None}
+WARMUP_TASK = None
+
+def warm_up_model(model_name: str, n_rows: int, rounds: int) -> Dict:
+    """
+    Time the scoring stages on a synthetic batch: one cold call, then warm ones
+    
+    Runs on the inference pool, so each worker pays its own first-call
+    costs. Bypasses the prediction cache and the passenger history so
+    synthetic traffic leaves no trace.
+    
+    Args:
+        model_name: Key into MODELS
+        n_rows: Passengers per batch
+        rounds: Warm calls after the cold one
+        
+    Returns:
+        Dict with cold_ms, warm_ms (median) and the worker pid and thread
+    """
+    passengers = [PassengerData(**passenger) for passenger in synthetic_passengers(n_rows, seed=n_rows)]
+    columns = passenger_columns(passengers)
+    scorer = MODELS[model_name]
+    
+    timings = []
+    for _ in range(rounds + 1):
+        start = time.perf_counter()
+        features = ENCODER.encode_columns(columns, out=ENCODER.scratch(n_rows))
+        scores = scorer.score(ENCODER.to_frame(features))
+        build_recommendations(columns, scores.is_anomaly)
+        timings.append((time.perf_counter() - start) * 1000)
+    
+    if scorer.explainer is not None:
+        scorer.explainer.shap_values(ENCODER.to_frame(ENCODER.encode_columns(columns)))
+    return {
+        "cold_ms": round(timings[0], 3),
+        "warm_ms": round(float(np.median(timings[1:])), 3) if rounds else None,
+        "pid": os.getpid(),
+        "thread": threading.get_ident()
+    }
+
+async def warm_up_service():
+    """
+    Warm every loaded model on every inference worker, then mark the API ready
+    
+    Process pools are started with all their workers first; each (model,
+    batch size) is then run once per worker (process or thread) in parallel.
+    """
+    READINESS.update(status="warming", started_at=datetime.now().isoformat())
+    pool = get_inference_pool()
+    try:
+        if pool.kind == 'process':
+            await asyncio.gather(*(pool.run(os.getpid) for _ in range(pool.max_workers)))
+        
+        for model_name in list(MODELS):
+            get_dispatcher(model_name)
+            results = {}
+            for n_rows in WARMUP_BATCH_SIZES:
+                runs = await asyncio.gather(*(
+                    pool.run(warm_up_model, model_name, n_rows, WARMUP_ROUNDS) for _ in range(pool.max_workers)
+                ))
+                results[str(n_rows)] = {
+                    "cold_ms": max(run["cold_ms"] for run in runs),
+                    "warm_ms": max((run["warm_ms"] for run in runs if run["warm_ms"] is not None), default=None),
+                    "workers": len({(run["pid"], run["thread"]) for run in runs})
+                }
+            READINESS["warmup"][model_name] = results
+            logger.info(f"Warmed up {model_name}: " + ", ".join(
+                f"{n} rows {r['cold_ms']:.1f} ms cold / {r['warm_ms'] or 0:.1f} ms warm" for n, r in results.items()
+            ))
+    except Exception as e:
+        # A model that cannot score keeps the worker out of rotation
+        logger.error(f"Warm-up failed: {str(e)}")
+        READINESS.update(status="failed", error=str(e), finished_at=datetime.now().isoformat())
+        return
+    
+    READINESS.update(status="ready" if MODELS else "failed", finished_at=datetime.now().isoformat())
+    logger.info(f"Warm-up finished; API ready ({READINESS['status']})")
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    """Load models on startup"""
+    """Load models on startup and start the warm-up"""
     logger.info("Starting UK Border Anomaly Detection API...")
+    global RELOAD_WATCHER, FEATURE_STORE, WARMUP_TASK, AUDIT_LOG
+    THREAD_LAYOUT.limit_loaded_pools()
     load_models()
-    logger.info("API ready to serve predictions")
+    logger.info(f"Thread layout: {json.dumps(THREAD_LAYOUT.describe(MODELS, get_inference_pool()))}")
+    if AUDIT_LOG_ENABLED:
+        if columnar.pa is None:
+            logger.warning("Audit log disabled: pyarrow is not installed")
+        else:
+            AUDIT_LOG = AuditLog.from_env()
+            AUDIT_LOG.start()
+    if os.path.exists(FEATURE_STORE_PATH):
+        FEATURE_STORE = FeatureStore.load(FEATURE_STORE_PATH, record_increments=True)
+    if MODEL_RELOAD_INTERVAL > 0:
+        RELOAD_WATCHER = asyncio.create_task(watch_model_artifacts(MODEL_RELOAD_INTERVAL))
+    if columnar.pa is not None:
+        await JOB_MANAGER.resume_all()
+    if WARMUP_ENABLED:
+        # Runs in the background: /health answers at once, /ready after warm-up
+        WARMUP_TASK = asyncio.create_task(warm_up_service())
+    else:
+        READINESS.update(status="ready" if MODELS else "failed", finished_at=datetime.now().isoformat())
+    logger.info(f"API started (readiness: {READINESS['status']})")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and the inference pool, and persist the feature store"""
+    if RELOAD_WATCHER is not None:
+        RELOAD_WATCHER.cancel()
+    if WARMUP_TASK is not None:
+        WARMUP_TASK.cancel()
+    # Interrupted jobs resume on the next start
+    await JOB_MANAGER.stop()
+    FEATURE_STORE.save_increments(FEATURE_STORE_PATH)
+    for dispatcher in DISPATCHERS.values():
+        await dispatcher.stop()
+    if INFERENCE_POOL is not None:
+        INFERENCE_POOL.shutdown()
+    if AUDIT_LOG is not None:
+        # Flushes the records still queued
+        AUDIT_LOG.close()
+    if ARRIVAL_RECORDER is not None:
+        ARRIVAL_RECORDER.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,410 @@
+"""
+UK Border Anomaly Detection - Prediction Audit Log
+Durable trail of screening decisions: records are queued in memory and a
+background writer appends them in columnar blocks, indexed by passenger_id
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import metrics
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency, only needed for the audit log
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FIELDS = ['timestamp', 'endpoint', 'model', 'model_version', 'passenger_id',
+                'is_anomaly', 'anomaly_score', 'risk_level']
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest')
+
+AUDIT_RECORDS = metrics.Counter(
+    'border_api_audit_records_total',
+    'Prediction audit records by outcome (queued, written, dropped)',
+    ['outcome']
+)
+
+# Each block is a length prefix followed by a self-contained Arrow IPC stream
+_BLOCK_HEADER = struct.Struct('<Q')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    block_id   INTEGER PRIMARY KEY,
+    segment    TEXT NOT NULL,
+    offset     INTEGER NOT NULL,
+    rows       INTEGER NOT NULL,
+    written_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    passenger_id TEXT NOT NULL,
+    block_id     INTEGER NOT NULL,
+    row          INTEGER NOT NULL,
+    PRIMARY KEY (passenger_id, block_id, row)
+) WITHOUT ROWID;
+"""
+
+
+def _arrow_schema():
+    return pa.schema([
+        ('timestamp', pa.string()), ('endpoint', pa.string()), ('model', pa.string()),
+        ('model_version', pa.string()), ('passenger_id', pa.string()), ('is_anomaly', pa.bool_()),
+        ('anomaly_score', pa.float64()), ('risk_level', pa.string())
+    ])
+
+
+def encode_block(columns: Dict[str, list]) -> bytes:
+    """Serialize audit columns as one length-prefixed Arrow IPC block"""
+    batch = pa.record_batch([pa.array(columns[name], type=field.type)
+                             for name, field in zip(AUDIT_FIELDS, _arrow_schema())], schema=_arrow_schema())
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    payload = sink.getvalue().to_pybytes()
+    return _BLOCK_HEADER.pack(len(payload)) + payload
+
+
+def read_block(path: str, offset: int):
+    """Read the record batch stored at offset in a segment file"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        (length,) = _BLOCK_HEADER.unpack(f.read(_BLOCK_HEADER.size))
+        return pa.ipc.open_stream(pa.BufferReader(f.read(length))).read_all()
+
+
+class AuditLog:
+    """
+    Bounded in-memory queue drained by a background writer thread
+
+    ``record`` only appends column lists to a deque, so the request path
+    never touches the disk. When the queue holds ``max_queue`` records,
+    the overflow policy applies: 'drop_newest' rejects incoming records,
+    'drop_oldest' evicts the oldest queued ones; either way the loss is
+    counted.
+
+    The writer flushes every ``flush_rows`` records or ``flush_interval``
+    seconds. Each flush appends one block to this process's current
+    segment file (segments rotate at ``segment_bytes``) and then indexes
+    the block's rows by passenger_id in a shared SQLite index, so a
+    passenger's history is one index query plus a read of the blocks that
+    hold it. Several API workers can share one audit directory.
+    """
+
+    def __init__(self, directory: str, max_queue: int = 100000, overflow: str = 'drop_newest',
+                 flush_rows: int = 5000, flush_interval: float = 1.0,
+                 segment_bytes: int = 256 * 1024 * 1024, fsync: bool = True,
+                 write_retries: int = 3, retry_backoff: float = 0.5):
+        """
+        Args:
+            directory: Directory for segment files and the index
+            max_queue: Records held in memory before the overflow policy applies
+            overflow: 'drop_newest' or 'drop_oldest'
+            flush_rows: Records that trigger a flush before the interval ends
+            flush_interval: Seconds between flushes of a partly filled queue
+            segment_bytes: Size at which a new segment file is started
+            fsync: fsync each block before indexing it
+            write_retries: Retries of a failed block before its records are dropped
+            retry_backoff: Seconds before the first retry, doubled for each next one
+        """
+        if pa is None:
+            raise RuntimeError("The audit log requires pyarrow to be installed")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Overflow policy must be one of {OVERFLOW_POLICIES}, got '{overflow}'")
+
+        self.directory = directory
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.write_retries = max(0, write_retries)
+        self.retry_backoff = retry_backoff
+
+        self._queue = collections.deque()
+        self._queued_rows = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._segment = None
+        self._segment_name = None
+        self._segment_seq = 0
+        self._local = threading.local()
+        self._overflowed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.write_failures = 0
+        self.blocks = 0
+        self.last_flush_ms = None
+
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> 'AuditLog':
+        """
+        Build an audit log from environment variables
+
+        AUDIT_LOG_DIR         directory (default: audit)
+        AUDIT_QUEUE_SIZE      records held in memory (default: 100000)
+        AUDIT_OVERFLOW        drop_newest (default) or drop_oldest
+        AUDIT_FLUSH_ROWS      records per block (default: 5000)
+        AUDIT_FLUSH_INTERVAL  seconds between flushes (default: 1.0)
+        AUDIT_FSYNC           fsync every block (default: 1)
+        AUDIT_WRITE_RETRIES   retries of a failed block (default: 3)
+        AUDIT_RETRY_BACKOFF   seconds before the first retry (default: 0.5)
+        """
+        return cls(
+            directory=os.environ.get('AUDIT_LOG_DIR', 'audit'),
+            max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 100000)),
+            overflow=os.environ.get('AUDIT_OVERFLOW', 'drop_newest'),
+            flush_rows=int(os.environ.get('AUDIT_FLUSH_ROWS', 5000)),
+            flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0)),
+            fsync=os.environ.get('AUDIT_FSYNC', '1').lower() not in ('0', 'false', 'no'),
+            write_retries=int(os.environ.get('AUDIT_WRITE_RETRIES', 3)),
+            retry_backoff=float(os.environ.get('AUDIT_RETRY_BACKOFF', 0.5))
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'),
+                                         timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    # Request path
+
+    def record(self, endpoint: str, model: str, model_version: str, timestamps: Sequence[str],
+               passenger_ids: Sequence[str], is_anomaly: Sequence[bool],
+               anomaly_score: Sequence[float], risk_level: Sequence[str]) -> int:
+        """
+        Queue one audit record per passenger (non-blocking)
+
+        Args:
+            endpoint, model, model_version: Shared by every record
+            timestamps, passenger_ids, is_anomaly, anomaly_score, risk_level:
+                One value per passenger
+
+        Returns:
+            Number of records accepted
+        """
+        n_rows = len(passenger_ids)
+        if not n_rows:
+            return 0
+        chunk = (endpoint, model, model_version, list(timestamps),
+                 list(passenger_ids), list(is_anomaly), list(anomaly_score), list(risk_level))
+
+        with self._condition:
+            room = self.max_queue - self._queued_rows
+            if n_rows > room and not self._overflowed:
+                self._overflowed = True
+                logger.warning(f"Audit queue full ({self.max_queue} records), applying {self.overflow}")
+            if n_rows > room and self.overflow == 'drop_oldest':
+                while self._queue and self.max_queue - self._queued_rows < n_rows:
+                    evicted = self._queue.popleft()
+                    self._queued_rows -= len(evicted[4])
+                    self._count_dropped(len(evicted[4]))
+                room = self.max_queue - self._queued_rows
+            if n_rows > room:
+                self._count_dropped(n_rows - room)
+                chunk = chunk[:3] + tuple(values[:room] for values in chunk[3:])
+                n_rows = room
+            if n_rows:
+                self._queue.append(chunk)
+                self._queued_rows += n_rows
+                if self._queued_rows >= self.flush_rows:
+                    self._condition.notify()
+
+        AUDIT_RECORDS.inc(n_rows, outcome='queued')
+        return n_rows
+
+    def _count_dropped(self, n_rows: int):
+        self.dropped += n_rows
+        AUDIT_RECORDS.inc(n_rows, outcome='dropped')
+
+    # Writer
+
+    def start(self):
+        """Start the background writer"""
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 30.0):
+        """Flush everything queued and stop the writer"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_segment()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closing and self._queued_rows < self.flush_rows:
+                    self._condition.wait(self.flush_interval)
+                chunks = list(self._queue)
+                self._queue.clear()
+                self._queued_rows = 0
+                # The queue has room again: the next overflow is a new episode to warn about
+                self._overflowed = False
+                closing = self._closing
+            if chunks:
+                self._write_with_retries(chunks)
+            if closing:
+                return
+
+    def _write_with_retries(self, chunks: List[tuple]):
+        """Write a block, retrying with exponential backoff; its records count as dropped if every attempt fails"""
+        n_rows = sum(len(chunk[4]) for chunk in chunks)
+        for attempt in range(self.write_retries + 1):
+            try:
+                self._write(chunks)
+                return
+            except Exception as e:
+                self.write_failures += 1
+                # Carry on in a new segment, past whatever part of the block was written
+                self._close_segment()
+                if attempt == self.write_retries:
+                    logger.error(f"Writing {n_rows} audit records failed after {attempt + 1} attempts, "
+                                 f"dropping them: {str(e)}")
+                    break
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Writing {n_rows} audit records failed, retrying in {delay:g}s: {str(e)}")
+                time.sleep(delay)
+        with self._condition:
+            self._count_dropped(n_rows)
+
+    def _close_segment(self):
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except OSError:
+                pass
+            self._segment = None
+
+    def _open_segment(self):
+        self._close_segment()
+        self._segment_seq += 1
+        self._segment_name = f"segment-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_seq:04d}.log"
+        self._segment = open(os.path.join(self.directory, self._segment_name), 'ab')
+
+    def _write(self, chunks: List[tuple]):
+        """Append one block and index its rows"""
+        start = time.perf_counter()
+        columns = {name: [] for name in AUDIT_FIELDS}
+        for endpoint, model, version, timestamps, ids, flags, scores, levels in chunks:
+            n_rows = len(ids)
+            columns['timestamp'] += timestamps
+            columns['endpoint'] += [endpoint] * n_rows
+            columns['model'] += [model] * n_rows
+            columns['model_version'] += [version] * n_rows
+            columns['passenger_id'] += ids
+            columns['is_anomaly'] += flags
+            columns['anomaly_score'] += scores
+            columns['risk_level'] += levels
+        block = encode_block(columns)
+
+        if self._segment is None or self._segment.tell() + len(block) > self.segment_bytes:
+            self._open_segment()
+        offset = self._segment.tell()
+        self._segment.write(block)
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+
+        # Index only after the block is on disk, so the index never points past the data
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            block_id = connection.execute(
+                "INSERT INTO blocks (segment, offset, rows, written_at) VALUES (?, ?, ?, ?)",
+                (self._segment_name, offset, len(columns['passenger_id']), datetime.now().isoformat())
+            ).lastrowid
+            connection.executemany(
+                "INSERT OR IGNORE INTO entries (passenger_id, block_id, row) VALUES (?, ?, ?)",
+                ((passenger_id, block_id, row) for row, passenger_id in enumerate(columns['passenger_id']))
+            )
+
+        n_rows = len(columns['passenger_id'])
+        self.written += n_rows
+        self.blocks += 1
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        AUDIT_RECORDS.inc(n_rows, outcome='written')
+
+    # Queries
+
+    def lookup(self, passenger_id: str, limit: int = 100) -> List[Dict]:
+        """
+        Screening history of a passenger, most recent first
+
+        Args:
+            passenger_id: Passenger to look up
+            limit: Maximum records returned
+
+        Returns:
+            List of audit records (dicts with AUDIT_FIELDS)
+        """
+        rows = self._connection().execute(
+            "SELECT b.segment, b.offset, e.row FROM entries e JOIN blocks b ON b.block_id = e.block_id "
+            "WHERE e.passenger_id = ? ORDER BY e.block_id DESC, e.row DESC LIMIT ?",
+            (passenger_id, limit)
+        ).fetchall()
+
+        records, tables = [], {}
+        for segment, offset, row in rows:
+            key = (segment, offset)
+            if key not in tables:
+                tables[key] = read_block(os.path.join(self.directory, segment), offset)
+            records.append(tables[key].slice(row, 1).to_pylist()[0])
+        return records
+
+    def stats(self) -> Dict:
+        return {
+            'directory': self.directory,
+            'queued': self._queued_rows,
+            'max_queue': self.max_queue,
+            'overflow': self.overflow,
+            'written': self.written,
+            'dropped': self.dropped,
+            'write_failures': self.write_failures,
+            'blocks': self.blocks,
+            'last_flush_ms': round(self.last_flush_ms, 3) if self.last_flush_ms is not None else None,
+            'writer_running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Look up passengers in the prediction audit log")
+    parser.add_argument('passenger_ids', nargs='+')
+    parser.add_argument('--dir', default='audit', help="Audit log directory")
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    audit = AuditLog(args.dir)
+    for passenger_id in args.passenger_ids:
+        start = time.perf_counter()
+        history = audit.lookup(passenger_id, args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(json.dumps({'passenger_id': passenger_id, 'lookup_ms': round(elapsed_ms, 3), 'records': history}, indent=2))
@@ -0,0 +1,223 @@
+"""
+UK Border Anomaly Detection - Micro-Batching Dispatcher
+Groups concurrent single-passenger requests into small vectorized batches
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class MicroBatcher:
+    """
+    Collect concurrent submissions and process them together
+
+    A batch is flushed as soon as it reaches ``max_batch_size`` items or
+    ``max_wait_ms`` has passed since its first item arrived, whichever
+    comes first. Each submitter receives the result at its own position.
+    Up to ``max_in_flight`` batches are processed at once; while they all
+    are, new items queue up and form the next batch.
+    """
+
+    def __init__(self, name: str, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32, max_wait_ms: float = 2.0, max_in_flight: int = 1):
+        """
+        Args:
+            name: Label used in logs and stats (usually the model name)
+            process_batch: Function (sync or async) mapping a list of items
+                to a list of results of the same length
+            max_batch_size: Maximum items per batch
+            max_wait_ms: Maximum time the first item in a batch waits for company
+            max_in_flight: Batches processed concurrently (usually the
+                inference pool's concurrency)
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_in_flight = max(1, int(max_in_flight))
+
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self._slots: asyncio.Semaphore = None
+        self._in_flight = set()
+
+        self.batches_processed = 0
+        self.items_processed = 0
+        self.max_batch_seen = 0
+        self.flush_reasons = {'size': 0, 'timeout': 0}
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram['inf'] = 0
+        self.fallbacks = 0
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Started micro-batcher for {self.name} "
+                        f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:g}, "
+                        f"max_in_flight={self.max_in_flight})")
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue an item and wait for its result
+
+        Args:
+            item: Single request payload
+
+        Returns:
+            The result produced for this item
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def stop(self):
+        """Cancel the worker and in-flight batches; pending submitters receive CancelledError"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        self._in_flight.clear()
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+
+    async def _collect(self) -> Tuple[List[Tuple[Any, asyncio.Future]], str]:
+        """Wait for the first item, then gather more until size or time runs out"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before waiting on the clock
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, 'timeout'
+            # asyncio.wait (unlike wait_for) never drops an item that arrives
+            # just as the timeout fires
+            getter = asyncio.ensure_future(self._queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=remaining)
+            if getter in done:
+                batch.append(getter.result())
+                continue
+            getter.cancel()
+            try:
+                batch.append(await getter)
+            except asyncio.CancelledError:
+                pass
+            return batch, 'timeout'
+
+        return batch, 'size'
+
+    async def _call(self, items: List[Any]) -> List[Any]:
+        results = self.process_batch(items)
+        if inspect.isawaitable(results):
+            results = await results
+        return results
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first, so items arriving meanwhile join the next batch
+            await self._slots.acquire()
+            try:
+                batch, reason = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            self._record(len(batch), reason)
+
+            task = asyncio.create_task(self._process(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _process(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            results = await self._call(items)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except asyncio.CancelledError:
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+            raise
+        except Exception as e:
+            await self._fail_over(items, futures, e)
+
+    async def _fail_over(self, items: List[Any], futures: List[asyncio.Future], error: Exception):
+        """Re-run a failed batch item by item so one bad input cannot fail its neighbours"""
+        if len(items) == 1:
+            if not futures[0].done():
+                futures[0].set_exception(error)
+            return
+
+        self.fallbacks += 1
+        logger.warning(f"Batch of {len(items)} failed for {self.name}, retrying individually: {str(error)}")
+
+        async def retry(item: Any, future: asyncio.Future):
+            try:
+                result = (await self._call([item]))[0]
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+        await asyncio.gather(*(retry(item, future) for item, future in zip(items, futures)))
+
+    def _record(self, size: int, reason: str):
+        self.batches_processed += 1
+        self.items_processed += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.flush_reasons[reason] += 1
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[bucket] += 1
+                break
+        else:
+            self.batch_size_histogram['inf'] += 1
+
+    def stats(self) -> Dict:
+        """Queue depth and batch-size statistics"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_in_flight': self.max_in_flight,
+            'batches_in_flight': len(self._in_flight),
+            'batches_processed': self.batches_processed,
+            'items_processed': self.items_processed,
+            'mean_batch_size': (
+                self.items_processed / self.batches_processed if self.batches_processed else 0.0
+            ),
+            'max_batch_size_seen': self.max_batch_seen,
+            'flush_reasons': dict(self.flush_reasons),
+            'batch_size_histogram': {str(k): v for k, v in self.batch_size_histogram.items()},
+            'fallbacks': self.fallbacks
+        }
@@ -0,0 +1,241 @@
+"""
+UK Border Anomaly Detection - API Benchmark
+Load test /predict and /predict/batch for every served model and report
+throughput and latency percentiles as JSON
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from synthetic import synthetic_passengers
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+WARMUP_REQUESTS = 10
+
+
+def _post(url: str, payload, timeout: float) -> int:
+    """POST JSON and return the status code (read the body so timing includes it)"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_scenario(url: str, payloads: List, concurrency: int, requests: int,
+                 warmup: int = WARMUP_REQUESTS, timeout: float = 30.0) -> Dict:
+    """
+    Send requests from ``concurrency`` threads and summarize their latency
+
+    Args:
+        url: Endpoint URL including query string
+        payloads: Request bodies, used round-robin
+        concurrency: Client threads sending back-to-back requests
+        requests: Total measured requests
+        warmup: Unmeasured requests sent first
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        Dict with throughput, latency percentiles (ms) and error count
+    """
+    for i in range(warmup):
+        _post(url, payloads[i % len(payloads)], timeout)
+
+    latencies = np.zeros(requests)
+    statuses = [0] * requests
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                statuses[i] = _post(url, payloads[i % len(payloads)], timeout)
+            except (urllib.error.URLError, OSError):
+                statuses[i] = -1
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = latencies * 1000
+    result = {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for code in statuses if code != 200),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 2),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'max_ms': round(float(latencies_ms.max()), 3),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(latencies_ms, PERCENTILES)):
+        result[f'p{q}_ms'] = round(float(value), 3)
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """Commit of the working tree (with a -dirty suffix for local changes), if in a git checkout"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def served_models(base_url: str) -> List[str]:
+    """Model names reported by the running API"""
+    with urllib.request.urlopen(f"{base_url}/models", timeout=10) as response:
+        return list(json.load(response)['available_models'])
+
+
+def thread_layout(base_url: str) -> Optional[Dict]:
+    """The API's /stats/threads report (None if the server does not have it)"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/stats/threads", timeout=10) as response:
+            return json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def wait_for_server(base_url: str, timeout: float = 120.0, process: subprocess.Popen = None):
+    """Block until /ready reports the API warmed up (failing early if ``process`` exits)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode} before becoming ready")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if json.load(response).get('status') == 'ready':
+                    return
+        except (urllib.error.URLError, OSError, ValueError):
+            # 503 while warming up
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"API at {base_url} did not become ready within {timeout:.0f}s")
+
+
+def run_benchmark(base_url: str, models: List[str] = None, concurrency: List[int] = (1, 8, 32),
+                  requests: int = 500, batch_size: int = 100, seed: int = 0) -> Dict:
+    """
+    Benchmark /predict and /predict/batch for each model and concurrency level
+
+    Args:
+        base_url: API root, e.g. http://127.0.0.1:8000
+        models: Models to test (defaults to every model the API serves)
+        concurrency: Client concurrency levels to test
+        requests: Measured requests per scenario
+        batch_size: Passengers per /predict/batch request
+        seed: Seed for the synthetic passengers
+
+    Returns:
+        Run metadata and one result per (endpoint, model, concurrency)
+    """
+    models = models or served_models(base_url)
+    layout_before = thread_layout(base_url)
+
+    scenarios = []
+    for model_name in models:
+        for endpoint in ('/predict', '/predict/batch'):
+            rows = batch_size if endpoint == '/predict/batch' else 1
+            for level in concurrency:
+                # Fresh passengers per scenario, so the prediction cache never
+                # answers a measured request
+                passengers = synthetic_passengers((requests + WARMUP_REQUESTS) * rows, seed + len(scenarios))
+                payloads = passengers if rows == 1 else [
+                    passengers[i:i + rows] for i in range(0, len(passengers), rows)
+                ]
+                logger.info(f"Benchmarking {endpoint} model={model_name} concurrency={level}")
+                result = run_scenario(f"{base_url}{endpoint}?model_name={model_name}", payloads, level, requests)
+                scenarios.append({'endpoint': endpoint, 'model': model_name, 'batch_size': rows, **result})
+
+    layout_after = thread_layout(base_url)
+    threads = None
+    if layout_before and layout_after:
+        # Native pools should keep their size; OS threads grow at most to the inference pool size
+        threads = {
+            'layout': layout_after,
+            'os_threads_before': layout_before['os_threads'],
+            'os_threads_after': layout_after['os_threads'],
+            'native_pools_stable': layout_before['native_pools'] == layout_after['native_pools'],
+        }
+
+    return {
+        'git_revision': git_revision(),
+        'timestamp': datetime.now().isoformat(),
+        'base_url': base_url,
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'settings': {'requests': requests, 'batch_size': batch_size, 'seed': seed,
+                     'concurrency': list(concurrency)},
+        'threads': threads,
+        'scenarios': scenarios
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Load test the scoring API and report latency percentiles")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of a running API")
+    parser.add_argument('--start-server', action='store_true',
+                        help="Start a local uvicorn instance of api:app for the run")
+    parser.add_argument('--models', nargs='*', help="Models to test (default: all served models)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument('--batch-size', type=int, default=100, help="Passengers per /predict/batch request")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        port = args.url.rsplit(':', 1)[-1].strip('/')
+        # Synthetic traffic must not enter the passenger history
+        env = {**os.environ, 'PASSENGER_HISTORY_RECORD': os.environ.get('PASSENGER_HISTORY_RECORD', '0')}
+        server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'api:app', '--port', port, '--log-level', 'warning'],
+                                  env=env)
+    try:
+        wait_for_server(args.url, process=server)
+        report = run_benchmark(args.url, args.models, args.concurrency, args.requests, args.batch_size, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        logger.info(f"Wrote benchmark report to {args.output}")
+    else:
+        print(output)
@@ -0,0 +1,239 @@
+"""
+UK Border Anomaly Detection - Cascade Scoring
+Cheap first-stage model with early exit; only uncertain passengers reach
+the full ensemble
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+import metrics
+from scoring import ModelScorer, ScoreResult
+
+logger = logging.getLogger(__name__)
+
+CASCADE_ROWS = metrics.Counter(
+    'border_api_cascade_rows_total',
+    'Passengers decided by each cascade stage',
+    ['cascade', 'stage']
+)
+
+
+def escalation_mask(first_scores: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Rows whose first-stage score falls strictly inside the uncertain (low, high) band"""
+    return (first_scores > low) & (first_scores < high)
+
+
+def merge_stages(first: ScoreResult, final: ScoreResult, escalated: np.ndarray) -> ScoreResult:
+    """
+    Combine stage outputs: first-stage results, overwritten by the final
+    stage for escalated rows
+
+    Args:
+        first: First-stage scores for every row
+        final: Final-stage scores for the escalated rows only
+        escalated: Boolean mask of escalated rows
+
+    Returns:
+        ScoreResult for every row
+    """
+    merged = []
+    for first_field, final_field in zip(first, final):
+        field = np.array(first_field, dtype=np.result_type(first_field, final_field))
+        field[escalated] = final_field
+        merged.append(field)
+    return ScoreResult(*merged)
+
+
+class CascadeScorer(ModelScorer):
+    """
+    Two-stage scorer with early exit
+
+    Passengers whose first-stage anomaly score is at or below ``low`` (clear
+    low risk) or at or above ``high`` (clear high risk) keep the first-stage
+    result. Only the band in between is re-scored by the final stage. Both
+    stages are looked up by name on every call, so hot-reloaded models are
+    picked up without rebuilding the cascade.
+    """
+
+    def __init__(self, name: str, models: Dict, first_stage: str, final_stage: str,
+                 low: float, high: float, config: Dict = None):
+        """
+        Args:
+            name: Registry name of the cascade (e.g. 'cascade')
+            models: Mapping of served scorers (e.g. api.MODELS)
+            first_stage: Name of the cheap model
+            final_stage: Name of the model for uncertain passengers
+            low: First-stage score at or below which the first stage decides
+            high: First-stage score at or above which the first stage decides
+            config: Serving options (micro-batching limits)
+        """
+        if not low < high:
+            raise ValueError(f"Cascade thresholds must satisfy low < high, got {low} and {high}")
+        super().__init__(name, None, config)
+        self.models = models
+        self.first_stage = first_stage
+        self.final_stage = final_stage
+        self.low = low
+        self.high = high
+
+    @property
+    def version(self) -> str:
+        """Changes whenever either stage is reloaded or the thresholds change"""
+        first, final = self.models[self.first_stage], self.models[self.final_stage]
+        return f"{first.version}|{final.version}|{self.low:g}-{self.high:g}"
+
+    @property
+    def model_type(self) -> str:
+        return f"Cascade({self.first_stage} -> {self.final_stage})"
+
+    def raw_scores(self, features) -> ScoreResult:
+        """Score with the first stage, then the uncertain rows with the final stage"""
+        first = self.models[self.first_stage].score(features)
+        escalated = escalation_mask(first.anomaly_score, self.low, self.high)
+        n_escalated = int(escalated.sum())
+
+        CASCADE_ROWS.inc(len(escalated) - n_escalated, cascade=self.name, stage=self.first_stage)
+        if not n_escalated:
+            return first
+
+        CASCADE_ROWS.inc(n_escalated, cascade=self.name, stage=self.final_stage)
+        final = self.models[self.final_stage].score(features[escalated])
+        return merge_stages(first, final, escalated)
+
+    def from_raw(self, raw: ScoreResult) -> ScoreResult:
+        """The stages have already derived every output"""
+        return raw
+
+
+def agreement_report(first: ScoreResult, final: ScoreResult, low: float, high: float,
+                     first_ms: float, final_ms: float) -> Dict:
+    """
+    Compare cascade output with final-stage-only scoring for one threshold pair
+
+    Args:
+        first: First-stage scores for the evaluation set
+        final: Final-stage scores for the same rows
+        low, high: Cascade thresholds
+        first_ms, final_ms: Measured per-call latency of each stage
+
+    Returns:
+        Escalation rate, agreement metrics and expected latency
+    """
+    escalated = escalation_mask(first.anomaly_score, low, high)
+    cascade = merge_stages(first, ScoreResult(*(field[escalated] for field in final)), escalated)
+    rate = float(escalated.mean())
+
+    # A call pays for the first stage, plus the final stage if any row escalates
+    expected_ms = first_ms + rate * final_ms
+    return {
+        'low': low,
+        'high': high,
+        'escalation_rate': round(rate, 4),
+        'label_agreement': round(float((cascade.is_anomaly == final.is_anomaly).mean()), 4),
+        'risk_level_agreement': round(float((cascade.risk_level == final.risk_level).mean()), 4),
+        'mean_abs_score_diff': round(float(np.abs(cascade.anomaly_score - final.anomaly_score).mean()), 6),
+        'expected_ms_per_passenger': round(expected_ms, 4),
+        'expected_savings': round(1 - expected_ms / final_ms, 4) if final_ms else None
+    }
+
+
+def time_per_passenger(scorer: ModelScorer, features, samples: int = 200) -> float:
+    """Median latency (ms) of scoring one passenger at a time"""
+    samples = min(samples, len(features))
+    timings = []
+    for i in range(samples):
+        row = features[i:i + 1]
+        start = time.perf_counter()
+        scorer.score(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def cascade_report(models: Dict, features, first_stage: str, final_stage: str,
+                   thresholds: Sequence = ()) -> Dict:
+    """
+    Agreement with final-stage-only scoring and expected latency savings
+
+    Args:
+        models: Served scorers by name
+        features: Held-out feature frame (FEATURE_COLUMNS)
+        first_stage, final_stage: Model names
+        thresholds: (low, high) pairs to evaluate
+
+    Returns:
+        Report with measured stage latencies and one entry per threshold pair
+    """
+    first_scorer, final_scorer = models[first_stage], models[final_stage]
+    first = first_scorer.score(features)
+    final = final_scorer.score(features)
+    first_ms = time_per_passenger(first_scorer, features)
+    final_ms = time_per_passenger(final_scorer, features)
+
+    return {
+        'rows': len(features),
+        'first_stage': first_stage,
+        'final_stage': final_stage,
+        'first_stage_ms': round(first_ms, 4),
+        'final_stage_ms': round(final_ms, 4),
+        'first_stage_score_percentiles': {
+            f'p{q}': round(float(v), 6)
+            for q, v in zip((1, 5, 25, 50, 75, 95, 99), np.percentile(first.anomaly_score, (1, 5, 25, 50, 75, 95, 99)))
+        },
+        'thresholds': [agreement_report(first, final, low, high, first_ms, final_ms) for low, high in thresholds]
+    }
+
+
+def load_features(path: str):
+    """
+    Read a held-out CSV as a feature frame
+
+    Accepts either the engineered FEATURE_COLUMNS or the raw PassengerData
+    fields the encoder needs.
+    """
+    import pandas as pd
+    from features import FEATURE_COLUMNS, INPUT_FIELDS, FeatureEncoder
+
+    data = pd.read_csv(path)
+    encoder = FeatureEncoder()
+    if set(FEATURE_COLUMNS) <= set(data.columns):
+        return encoder.to_frame(data[FEATURE_COLUMNS].to_numpy(dtype=encoder.dtype))
+    if set(INPUT_FIELDS) <= set(data.columns):
+        columns = {name: data[name].to_numpy() for name in INPUT_FIELDS}
+        columns['arrival_date'] = data['arrival_date'].astype(str).tolist()
+        return encoder.to_frame(encoder.encode_columns(columns))
+    raise ValueError(f"{path} has neither the feature columns nor the passenger fields {INPUT_FIELDS}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Evaluate cascade thresholds against final-stage-only scoring")
+    parser.add_argument('--data', help="Held-out CSV (feature columns or raw passenger fields)")
+    parser.add_argument('--synthetic', type=int, default=5000,
+                        help="Synthetic passengers to use when --data is not given")
+    parser.add_argument('--first-stage', default='xgboost')
+    parser.add_argument('--final-stage', default='ensemble')
+    parser.add_argument('--low', type=float, nargs='+', default=[0.01, 0.02, 0.05, 0.1],
+                        help="Candidate low thresholds")
+    parser.add_argument('--high', type=float, nargs='+', default=[0.9, 0.95, 0.98, 0.99],
+                        help="Candidate high thresholds")
+    args = parser.parse_args()
+
+    import api
+    api.load_models()
+
+    if args.data:
+        frame = load_features(args.data)
+    else:
+        from synthetic import synthetic_passengers
+        passengers = [api.PassengerData(**p) for p in synthetic_passengers(args.synthetic)]
+        frame = api.ENCODER.to_frame(api.ENCODER.encode_batch(passengers))
+
+    pairs: List = [(low, high) for low in args.low for high in args.high if low < high]
+    print(json.dumps(cascade_report(api.MODELS, frame, args.first_stage, args.final_stage, pairs), indent=2))
@@ -0,0 +1,88 @@
+"""
+UK Border Anomaly Detection - Request Coalescing
+Single-flight execution: concurrent identical requests share one computation
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+COALESCED_REQUESTS = metrics.Counter(
+    'border_api_coalesced_requests_total',
+    'Requests by single-flight role: leader (ran the computation) or follower (shared it)',
+    ['group', 'role']
+)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key
+
+    The first caller for a key (the leader) starts the computation as a
+    separate task; callers arriving with the same key while it is in
+    flight (followers) await that task instead of starting their own.
+    The key is released when the computation finishes, so later requests
+    compute afresh (repeats over time are the prediction cache's job).
+    A caller that disconnects does not cancel the shared computation.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Label used in stats and metrics (e.g. 'predict')
+        """
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        self.leaders = 0
+        self.followers = 0
+        self.max_followers = 0
+        self._followers_by_key: Dict[Hashable, int] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return compute()'s result, sharing it with concurrent callers of the same key
+
+        Args:
+            key: Identifies identical requests
+            compute: Zero-argument coroutine function doing the work
+
+        Returns:
+            The (shared) result; exceptions are raised to every caller
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            self._followers_by_key[key] = 0
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.leaders += 1
+            COALESCED_REQUESTS.inc(group=self.name, role='leader')
+        else:
+            self.followers += 1
+            self._followers_by_key[key] += 1
+            COALESCED_REQUESTS.inc(group=self.name, role='follower')
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Retrieved here too, in case every caller has gone away
+            task.exception()
+        self.max_followers = max(self.max_followers, self._followers_by_key.pop(key, 0))
+
+    def stats(self) -> Dict:
+        """Requests computed, requests deduplicated and current in-flight keys"""
+        total = self.leaders + self.followers
+        return {
+            'requests': total,
+            'computations': self.leaders,
+            'deduplicated': self.followers,
+            'dedup_rate': self.followers / total if total else 0.0,
+            'max_followers_per_computation': self.max_followers,
+            'in_flight': len(self._in_flight)
+        }
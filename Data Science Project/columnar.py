@@ -0,0 +1,411 @@
+"""
+UK Border Anomaly Detection - Columnar Passenger Batches
+Vectorized validation of Arrow/Parquet passenger extracts against the
+PassengerData schema, without building one pydantic object per row
+"""
+
+import io
+import logging
+from typing import Dict, List, Literal, Optional, Sequence, Tuple, Union, get_args, get_origin
+
+import numpy as np
+import pandas as pd
+
+from features import calendar_features
+from scoring import ScoreResult
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for Arrow/Parquet bodies
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM = 'arrow'
+PARQUET = 'parquet'
+MEDIA_TYPES = {
+    ARROW_STREAM: 'application/vnd.apache.arrow.stream',
+    PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+class ColumnarValidationError(ValueError):
+    """The batch as a whole cannot be validated (e.g. a required column is missing)"""
+
+
+def field_specs(model) -> Dict[str, Dict]:
+    """
+    Read types, defaults and ge/le bounds from a pydantic model
+
+    Keeps the vectorized checks in step with the Field constraints.
+
+    Args:
+        model: Pydantic model class (e.g. PassengerData)
+
+    Returns:
+        Dict of field name to spec (type, required, nullable, default, ge, le,
+        choices for Literal fields)
+    """
+    specs = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        nullable = False
+        if get_origin(annotation) is Union and type(None) in get_args(annotation):
+            nullable = True
+            annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+        choices = None
+        if get_origin(annotation) is Literal:
+            choices = get_args(annotation)
+            annotation = type(choices[0])
+
+        spec = {
+            'type': annotation,
+            'required': field.is_required(),
+            'nullable': nullable,
+            'default': None if field.is_required() else field.default,
+        }
+        for constraint in field.metadata:
+            for bound in ('ge', 'le'):
+                if getattr(constraint, bound, None) is not None:
+                    spec[bound] = getattr(constraint, bound)
+        if choices:
+            spec['choices'] = choices
+        specs[name] = spec
+    return specs
+
+
+def choices_message(choices: Tuple) -> str:
+    """Pydantic's wording for a value outside a Literal"""
+    quoted = [repr(choice) for choice in choices]
+    if len(quoted) == 1:
+        return f"Input should be {quoted[0]}"
+    return f"Input should be {', '.join(quoted[:-1])} or {quoted[-1]}"
+
+
+# Arrow types accepted for each field type (booleans may also come as 0/1
+# integers, as from CSV extracts)
+_ARROW_KINDS = {
+    str: ('string', ('is_string', 'is_large_string')),
+    int: ('integer', ('is_integer', 'is_floating')),
+    float: ('number', ('is_integer', 'is_floating', 'is_decimal')),
+    bool: ('boolean', ('is_boolean', 'is_integer')),
+}
+
+
+def _type_mismatch(column, spec: Dict) -> Optional[str]:
+    """Expected type if an Arrow column cannot hold the field type, else None"""
+    if column.null_count == len(column):
+        return None
+    arrow_type = column.type
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    expected, predicates = _ARROW_KINDS[spec['type']]
+    if any(getattr(pa.types, predicate)(arrow_type) for predicate in predicates):
+        return None
+    return expected
+
+
+def _column_values(column, spec: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert an Arrow column to (values, null_mask) for the field type"""
+    nulls = column.is_null().to_numpy(zero_copy_only=False)
+    if spec['type'] is str:
+        return np.array(column.to_pylist(), dtype=object), nulls
+    if spec['type'] is bool:
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        if pa.types.is_integer(column.type):
+            values = column.fill_null(0).to_numpy(zero_copy_only=False)
+            # Anything but 0/1 is left as NaN for validate_table to reject
+            return np.where(np.isin(values, (0, 1)), values, np.nan), nulls
+        values = column.fill_null(False).cast(pa.bool_()).to_numpy(zero_copy_only=False)
+        return values.astype(bool), nulls
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    values = column.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return values.astype(np.float64), nulls
+
+
+def validate_table(table, model) -> Tuple[Dict[str, np.ndarray], np.ndarray, List[Optional[str]]]:
+    """
+    Validate an Arrow table against a pydantic model with column operations
+
+    Args:
+        table: pyarrow.Table with one column per model field
+        model: Pydantic model class (e.g. PassengerData)
+
+    Returns:
+        Tuple of (typed columns with defaults filled, valid-row mask,
+        per-row error message or None)
+
+    Raises:
+        ColumnarValidationError: If a required column is missing or a column
+            has an Arrow type the field cannot take
+    """
+    n_rows = table.num_rows
+    specs = field_specs(model)
+    missing = [name for name, spec in specs.items()
+               if spec['required'] and name not in table.column_names]
+    if missing:
+        raise ColumnarValidationError(f"Missing required columns: {missing}")
+    mismatched = []
+    for name, spec in specs.items():
+        if name in table.column_names:
+            expected = _type_mismatch(table.column(name), spec)
+            if expected:
+                mismatched.append(f"{name}: expected {expected}, got {table.column(name).type}")
+    if mismatched:
+        raise ColumnarValidationError(f"Column types do not match the schema: {'; '.join(mismatched)}")
+
+    problems: List[List[str]] = [[] for _ in range(n_rows)]
+
+    def flag(mask: np.ndarray, message: str):
+        for row in np.flatnonzero(mask):
+            problems[row].append(message)
+
+    columns = {}
+    for name, spec in specs.items():
+        if name not in table.column_names:
+            default = spec['default']
+            columns[name] = (
+                np.full(n_rows, default, dtype=object) if default is None
+                else np.full(n_rows, default)
+            )
+            continue
+
+        values, nulls = _column_values(table.column(name), spec)
+        if nulls.any():
+            if spec['required']:
+                flag(nulls, f"{name}: Field required")
+            elif not spec['nullable']:
+                values = values.copy()
+                values[nulls] = spec['default']
+                nulls = np.zeros(n_rows, dtype=bool)
+
+        present = ~nulls
+        if spec['type'] is bool and values.dtype != bool:
+            flag(present & np.isnan(values), f"{name}: Input should be a valid boolean")
+            values = np.nan_to_num(values).astype(bool)
+        if spec['type'] is int:
+            with np.errstate(invalid='ignore'):
+                integral = np.isfinite(values) & (values == np.floor(values))
+            flag(present & ~integral, f"{name}: Input should be a valid integer")
+        if 'ge' in spec:
+            with np.errstate(invalid='ignore'):
+                flag(present & ~(values >= spec['ge']), f"{name}: Input should be greater than or equal to {spec['ge']}")
+        if 'le' in spec:
+            with np.errstate(invalid='ignore'):
+                flag(present & ~(values <= spec['le']), f"{name}: Input should be less than or equal to {spec['le']}")
+        if 'choices' in spec:
+            flag(present & ~np.isin(values, spec['choices']), f"{name}: {choices_message(spec['choices'])}")
+
+        if spec['type'] is int and not spec['nullable']:
+            values = np.where(present, np.nan_to_num(values), 0).astype(np.int64)
+        columns[name] = values
+
+    # Dates: each distinct value is parsed once through the shared cache
+    dates = columns['arrival_date']
+    valid_dates = {}
+    for value in set(dates.tolist()):
+        try:
+            calendar_features(value)
+            valid_dates[value] = True
+        except (TypeError, ValueError):
+            valid_dates[value] = False
+    flag(np.array([not valid_dates[value] for value in dates.tolist()], dtype=bool),
+         "arrival_date: Date must be in YYYY-MM-DD format")
+
+    errors = ['; '.join(messages) if messages else None for messages in problems]
+    valid = np.array([message is None for message in errors], dtype=bool)
+    return columns, valid, errors
+
+
+class _Missing:
+    """Type of the placeholder for keys absent from a JSON record"""
+
+
+_MISSING = _Missing()
+
+# pandas.api.types.infer_dtype results that need no per-value type check.
+# Integer columns with nulls or absent keys are upcast to float by pandas;
+# their values are checked for being integral instead
+_INFERRED_TYPES = {
+    str: ('string', 'empty'),
+    int: ('integer', 'floating', 'mixed-integer-float', 'empty'),
+    float: ('integer', 'floating', 'mixed-integer-float', 'empty'),
+    bool: ('boolean', 'empty'),
+}
+
+# JSON types accepted without coercion for each field type
+_STRICT_TYPES = {str: (str,), int: (int,), float: (int, float), bool: (bool,)}
+
+
+def validate_records(records: Sequence, model) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Validate JSON-decoded records against a pydantic model with column operations
+
+    Checks the strict form of the model's rules column by column: JSON
+    types, required fields, ge/le bounds, Literal choices and arrival
+    dates (each distinct date parsed once). Rows failing any check are
+    flagged rather than reported: the caller runs just those through the
+    pydantic model, which words the errors exactly as request validation
+    does and accepts the looser inputs it coerces (e.g. numeric strings).
+
+    Args:
+        records: Decoded JSON array, one object per passenger
+        model: Pydantic model class (e.g. PassengerData)
+
+    Returns:
+        Tuple of (typed columns for every field with defaults filled, mask
+        of rows needing model validation). Every column is a writable array
+        of its own. Numeric nullable fields are float64 with NaN for null;
+        string fields are object arrays.
+    """
+    n_rows = len(records)
+    specs = field_specs(model)
+    is_record = np.array([type(record) is dict for record in records], dtype=bool)
+    rows = records if is_record.all() else [
+        record if ok else {} for record, ok in zip(records, is_record.tolist())
+    ]
+    frame = pd.DataFrame(rows, columns=list(specs), index=pd.RangeIndex(n_rows))
+    rejected = ~is_record
+
+    columns = {}
+    for name, spec in specs.items():
+        column = frame[name]
+        nulls = column.isna().to_numpy()
+        absent = np.zeros(n_rows, dtype=bool)
+        if nulls.any():
+            # Tell absent keys from explicit nulls (or NaN), for the null cells only
+            null_rows = np.flatnonzero(nulls)
+            raw = [rows[row].get(name, _MISSING) for row in null_rows.tolist()]
+            is_absent = np.array([value is _MISSING for value in raw], dtype=bool)
+            allowed = is_absent & (not spec['required'])
+            if spec['nullable']:
+                allowed |= np.array([value is None for value in raw], dtype=bool)
+            rejected[null_rows[~allowed]] = True
+            if spec['default'] is not None:
+                absent[null_rows[is_absent]] = True
+        present = ~nulls
+
+        if pd.api.types.infer_dtype(column, skipna=True) not in _INFERRED_TYPES[spec['type']]:
+            objects = column.to_numpy(dtype=object)
+            strict = _STRICT_TYPES[spec['type']]
+            wrong_type = np.zeros(n_rows, dtype=bool)
+            wrong_type[present] = [type(value) not in strict for value in objects[present].tolist()]
+            rejected |= wrong_type
+            present &= ~wrong_type
+
+        if spec['type'] is str:
+            # An owned copy: pandas may hand out a read-only view, and the
+            # caller patches rows the model re-validates into these arrays
+            values = np.array(column.to_numpy(dtype=object, na_value=None), dtype=object)
+            if 'choices' in spec:
+                rejected |= present & ~column.isin(spec['choices']).to_numpy()
+        elif spec['type'] is bool:
+            values = np.zeros(n_rows, dtype=bool)
+            values[present] = column.to_numpy(dtype=object)[present].astype(bool)
+        else:
+            values = np.full(n_rows, np.nan)
+            try:
+                values[present] = column.to_numpy(dtype=object)[present].astype(np.float64)
+            except OverflowError:
+                # Integers beyond float range: leave the column to the model
+                rejected |= present
+                present[:] = False
+            with np.errstate(invalid='ignore'):
+                if 'ge' in spec:
+                    rejected |= present & ~(values >= spec['ge'])
+                if 'le' in spec:
+                    rejected |= present & ~(values <= spec['le'])
+                if spec['type'] is int:
+                    # Fractional values, and integers beyond exact float range,
+                    # go to the model for its error or value
+                    rejected |= present & ~(np.equal(np.mod(values, 1), 0) & (np.abs(values) < 2.0 ** 53))
+        if absent.any():
+            values[absent] = spec['default']
+        if spec['type'] is int and not spec['nullable']:
+            values = np.where(rejected, 0, values).astype(np.int64)
+        columns[name] = values
+
+    # Dates: each distinct value is parsed once through the shared cache
+    dates = columns['arrival_date']
+    checked = ~rejected
+    valid_dates = {}
+    for value in set(dates[checked].tolist()):
+        try:
+            calendar_features(value)
+            valid_dates[value] = True
+        except ValueError:
+            valid_dates[value] = False
+    rejected[checked] = [not valid_dates[value] for value in dates[checked].tolist()]
+    return columns, rejected
+
+
+def read_table(body: bytes):
+    """
+    Decode an Arrow IPC (stream or file) or Parquet body
+
+    Returns:
+        Tuple of (pyarrow.Table, format name to answer in)
+    """
+    if body[:4] == b'PAR1':
+        return pq.read_table(io.BytesIO(body)), PARQUET
+    if body[:6] == b'ARROW1':
+        return pa.ipc.open_file(pa.BufferReader(body)).read_all(), ARROW_STREAM
+    return pa.ipc.open_stream(pa.BufferReader(body)).read_all(), ARROW_STREAM
+
+
+def write_table(table, fmt: str) -> bytes:
+    """Encode a table as an Arrow IPC stream or Parquet file"""
+    sink = io.BytesIO()
+    if fmt == PARQUET:
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+def empty_scores():
+    """Score arrays for a batch with no valid rows"""
+    return ScoreResult(
+        is_anomaly=np.zeros(0, dtype=bool), anomaly_score=np.zeros(0),
+        confidence=np.zeros(0), risk_level=np.zeros(0, dtype=object)
+    )
+
+
+def results_table(passenger_ids: np.ndarray, valid: np.ndarray, errors: List[Optional[str]],
+                  scores, recommendations: List[List[str]], model_name: str, timestamp: str):
+    """
+    Assemble per-row results into an Arrow table aligned with the input rows
+
+    Rows that failed validation carry nulls in the score columns and their
+    message in ``error``.
+    """
+    n_rows = len(valid)
+    invalid = ~valid
+
+    def scattered(values, dtype):
+        out = np.zeros(n_rows, dtype=dtype)
+        out[valid] = values
+        return pa.array(out, mask=invalid)
+
+    risk_levels = np.full(n_rows, None, dtype=object)
+    risk_levels[valid] = scores.risk_level
+    recs = [None] * n_rows
+    for row, rec in zip(np.flatnonzero(valid).tolist(), recommendations):
+        recs[row] = rec
+
+    return pa.table({
+        'passenger_id': pa.array(passenger_ids.tolist(), type=pa.string()),
+        'is_anomaly': scattered(scores.is_anomaly, bool),
+        'anomaly_score': scattered(scores.anomaly_score, np.float64),
+        'risk_level': pa.array(risk_levels.tolist(), type=pa.string()),
+        'confidence': scattered(scores.confidence, np.float64),
+        'model_used': pa.array([model_name] * n_rows, type=pa.string()),
+        'timestamp': pa.array([timestamp] * n_rows, type=pa.string()),
+        'recommendations': pa.array(recs, type=pa.list_(pa.string())),
+        'error': pa.array(errors, type=pa.string()),
+    })
@@ -0,0 +1,339 @@
+"""
+UK Border Anomaly Detection - Aggregate Feature Store
+Per-country and per-airport running aggregates in array-backed lookup tables
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lead times under a week count as last-minute bookings (as in the
+# short-lead-time screening rule)
+LAST_MINUTE_DAYS = 7
+
+# Passenger fields the aggregates are computed from
+AGGREGATE_INPUTS = ['origin_country', 'arrival_port', 'booking_lead_days', 'previous_visits', 'ticket_type']
+
+
+class AggregateTable:
+    """
+    Running sums per key, with the derived features kept up to date
+
+    Keys map to row numbers through a dict; sums and features live in
+    NumPy arrays that grow by doubling. An update touches only the rows of
+    the keys it contains, so ingesting arrivals never rescans history.
+    """
+
+    def __init__(self, inputs: Sequence[str], features: Dict[str, tuple], capacity: int = 256):
+        """
+        Args:
+            inputs: Per-passenger values summed per key (their squares are
+                summed too, for standard deviations)
+            features: Feature name -> ('mean' or 'std', input name)
+            capacity: Initial number of key rows
+        """
+        self.inputs = list(inputs)
+        self.feature_names = list(features)
+        self._feature_specs = [(kind, self.inputs.index(source)) for kind, source in features.values()]
+
+        self.index: Dict[str, int] = {}
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.sums = np.zeros((capacity, len(self.inputs)), dtype=np.float64)
+        self.squares = np.zeros((capacity, len(self.inputs)), dtype=np.float64)
+        self.table = np.full((capacity, len(self.feature_names)), np.nan, dtype=np.float64)
+
+        # Row used for keys never seen: aggregates over every key
+        self.total_count = 0
+        self.total_sums = np.zeros(len(self.inputs), dtype=np.float64)
+        self.total_squares = np.zeros(len(self.inputs), dtype=np.float64)
+        self.fallback = np.full(len(self.feature_names), np.nan, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _rows_for(self, keys: Sequence[str]) -> np.ndarray:
+        """Row numbers for keys, adding rows for new keys"""
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.index]
+        if len(self.index) + len(new_keys) > len(self.counts):
+            # Grow before publishing new keys, so concurrent lookups never
+            # see a key whose row does not exist yet
+            self._grow(len(self.index) + len(new_keys))
+        for key in new_keys:
+            self.index[key] = len(self.index)
+        return np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def _grow(self, needed: int):
+        capacity = len(self.counts)
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self.counts)
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.sums = np.vstack([self.sums, np.zeros((extra, self.sums.shape[1]))])
+        self.squares = np.vstack([self.squares, np.zeros((extra, self.squares.shape[1]))])
+        self.table = np.vstack([self.table, np.full((extra, self.table.shape[1]), np.nan)])
+
+    def _derive(self, counts: np.ndarray, sums: np.ndarray, squares: np.ndarray) -> np.ndarray:
+        """Features from running sums (rows of sums/squares align with counts)"""
+        counts = counts.reshape(-1, 1).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            # Sample standard deviation (ddof=1), like pandas groupby().std()
+            variances = np.maximum(squares - sums * means, 0) / (counts - 1)
+
+        out = np.empty((len(counts), len(self._feature_specs)), dtype=np.float64)
+        for j, (kind, source) in enumerate(self._feature_specs):
+            out[:, j] = means[:, source] if kind == 'mean' else np.sqrt(variances[:, source])
+        out[counts[:, 0] == 0] = np.nan
+        return out
+
+    def update(self, keys: Sequence[str], values: np.ndarray):
+        """
+        Add observations and refresh the features of the touched keys
+
+        Args:
+            keys: One key per observation
+            values: Matrix with one column per input, aligned with keys
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(keys), len(self.inputs))
+        rows = self._rows_for(keys)
+
+        np.add.at(self.counts, rows, 1)
+        np.add.at(self.sums, rows, values)
+        np.add.at(self.squares, rows, values ** 2)
+
+        touched = np.unique(rows)
+        self.table[touched] = self._derive(self.counts[touched], self.sums[touched], self.squares[touched])
+
+        self.total_count += len(keys)
+        self.total_sums += values.sum(axis=0)
+        self.total_squares += (values ** 2).sum(axis=0)
+        self._refresh_fallback()
+
+    def merge(self, other: 'AggregateTable'):
+        """Add the running sums of another table with the same inputs"""
+        n = len(other.index)
+        if n:
+            rows = self._rows_for(list(other.index))
+            self.counts[rows] += other.counts[:n]
+            self.sums[rows] += other.sums[:n]
+            self.squares[rows] += other.squares[:n]
+            self.table[rows] = self._derive(self.counts[rows], self.sums[rows], self.squares[rows])
+
+        self.total_count += other.total_count
+        self.total_sums += other.total_sums
+        self.total_squares += other.total_squares
+        self._refresh_fallback()
+
+    def _refresh_fallback(self):
+        self.fallback = self._derive(np.array([self.total_count]), self.total_sums[None, :],
+                                     self.total_squares[None, :])[0]
+
+    def lookup(self, keys: Sequence[str]) -> np.ndarray:
+        """Feature rows for keys; unseen keys get the all-keys aggregates"""
+        rows = np.fromiter((self.index.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        out = self.table[np.maximum(rows, 0)]
+        out[rows < 0] = self.fallback
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        n = len(self.index)
+        return {
+            'counts': self.counts[:n], 'sums': self.sums[:n], 'squares': self.squares[:n],
+            'total': np.concatenate([[self.total_count], self.total_sums, self.total_squares])
+        }
+
+    def restore(self, keys: List[str], state: Dict[str, np.ndarray]):
+        n = len(keys)
+        self.index = {key: i for i, key in enumerate(keys)}
+        self._grow(max(n, 1))
+        self.counts[:n] = state['counts']
+        self.sums[:n] = state['sums']
+        self.squares[:n] = state['squares']
+        self.table[:n] = self._derive(self.counts[:n], self.sums[:n], self.squares[:n])
+
+        width = len(self.inputs)
+        total = state['total']
+        self.total_count = int(total[0])
+        self.total_sums = total[1:1 + width].copy()
+        self.total_squares = total[1 + width:].copy()
+        self._refresh_fallback()
+
+
+class FeatureStore:
+    """
+    Aggregated passenger features by origin country and arrival airport
+
+    Serves the aggregated features of data/processed/feature_list.csv that
+    can be derived from PassengerData fields. Lookups are a dict access and
+    an array row read; updates are incremental.
+    """
+
+    def __init__(self, record_increments: bool = False):
+        """
+        Args:
+            record_increments: Also keep the arrivals ingested since the last
+                save apart, so ``save_increments`` can add them to a file
+                other processes update too
+        """
+        self.country, self.airport = self._tables()
+        self.record_increments = record_increments
+        self._unsaved = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tables():
+        country = AggregateTable(
+            inputs=['booking_lead_days', 'previous_visits', 'is_one_way'],
+            features={
+                'country_booking_lead_days_mean': ('mean', 'booking_lead_days'),
+                'country_booking_lead_days_std': ('std', 'booking_lead_days'),
+                'country_previous_visits_uk_mean': ('mean', 'previous_visits'),
+                'country_is_one_way_mean': ('mean', 'is_one_way'),
+            }
+        )
+        airport = AggregateTable(
+            inputs=['booking_lead_days', 'is_last_minute'],
+            features={
+                'airport_avg_lead_time': ('mean', 'booking_lead_days'),
+                'airport_last_minute_rate': ('mean', 'is_last_minute'),
+            }
+        )
+        return country, airport
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.country.feature_names + self.airport.feature_names
+
+    def update(self, columns: Dict[str, Sequence]):
+        """
+        Ingest arrivals
+
+        Args:
+            columns: Column arrays for the AGGREGATE_INPUTS fields
+        """
+        lead = np.asarray(columns['booking_lead_days'], dtype=np.float64)
+        one_way = np.asarray(columns['ticket_type'], dtype=object) == 'one_way'
+        country_values = np.column_stack([lead, np.asarray(columns['previous_visits'], dtype=np.float64), one_way])
+        airport_values = np.column_stack([lead, lead < LAST_MINUTE_DAYS])
+
+        countries, airports = list(columns['origin_country']), list(columns['arrival_port'])
+        with self._lock:
+            self.country.update(countries, country_values)
+            self.airport.update(airports, airport_values)
+            if self.record_increments:
+                if self._unsaved is None:
+                    self._unsaved = self._tables()
+                self._unsaved[0].update(countries, country_values)
+                self._unsaved[1].update(airports, airport_values)
+
+    def lookup(self, countries: Sequence[str], airports: Sequence[str]) -> np.ndarray:
+        """
+        Aggregated features for a batch of passengers
+
+        Returns:
+            Matrix with columns in feature_names order
+        """
+        return np.hstack([self.country.lookup(countries), self.airport.lookup(airports)])
+
+    def features_for(self, origin_country: str, arrival_port: str) -> Dict[str, float]:
+        """Aggregated features for one passenger (NaN becomes None)"""
+        row = self.lookup([origin_country], [arrival_port])[0]
+        return {name: (None if np.isnan(value) else float(value)) for name, value in zip(self.feature_names, row)}
+
+    def stats(self) -> Dict:
+        return {
+            'countries': len(self.country),
+            'airports': len(self.airport),
+            'arrivals': self.country.total_count,
+            'unsaved_arrivals': self._unsaved[0].total_count if self._unsaved is not None else 0
+        }
+
+    def save(self, path: str):
+        """Write the running sums to an .npz file (written to a temporary file, then renamed)"""
+        with self._lock:
+            arrays = {}
+            for group, table in (('country', self.country), ('airport', self.airport)):
+                for name, array in table.state().items():
+                    arrays[f'{group}_{name}'] = array
+                arrays[f'{group}_keys'] = np.array(json.dumps(list(table.index)))
+        staging = f"{path}.tmp.npz"
+        np.savez(staging, **arrays)
+        os.replace(staging, path)
+
+    def save_increments(self, path: str):
+        """
+        Add the arrivals ingested since the last save to the store file
+
+        The file is re-read and merged under an exclusive lock, so API workers
+        sharing it each add their own arrivals instead of overwriting the
+        others' on shutdown.
+        """
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, None
+        if unsaved is None:
+            return
+        with _locked(f"{path}.lock"):
+            store = FeatureStore.load(path) if os.path.exists(path) else FeatureStore()
+            store.country.merge(unsaved[0])
+            store.airport.merge(unsaved[1])
+            store.save(path)
+        logger.info(f"Added {unsaved[0].total_count} arrivals to {path}")
+
+    @classmethod
+    def load(cls, path: str, record_increments: bool = False) -> 'FeatureStore':
+        store = cls(record_increments)
+        with np.load(path) as data:
+            for group, table in (('country', store.country), ('airport', store.airport)):
+                keys = json.loads(str(data[f'{group}_keys']))
+                table.restore(keys, {name: data[f'{group}_{name}'] for name in ('counts', 'sums', 'squares', 'total')})
+        logger.info(f"Loaded feature store from {path} ({store.stats()})")
+        return store
+
+    def update_frame(self, frame):
+        """Ingest a DataFrame of arrivals (needs the AGGREGATE_INPUTS columns)"""
+        self.update({name: frame[name].to_numpy() for name in AGGREGATE_INPUTS})
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """Hold an exclusive lock on a lock file (a no-op where fcntl is unavailable)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Precompute per-country and per-airport aggregate features")
+    parser.add_argument('--data', required=True, help="CSV of historical arrivals with PassengerData columns")
+    parser.add_argument('--output', default='models/aggregate_features.npz')
+    parser.add_argument('--chunksize', type=int, default=500000, help="Rows read per chunk")
+    args = parser.parse_args()
+
+    store = FeatureStore()
+    for chunk in pd.read_csv(args.data, usecols=AGGREGATE_INPUTS, chunksize=args.chunksize):
+        store.update_frame(chunk)
+    store.save(args.output)
+    print(json.dumps(store.stats(), indent=2))
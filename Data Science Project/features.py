@@ -0,0 +1,268 @@
+"""
+UK Border Anomaly Detection - Feature Encoder
+Fixed-layout feature encoding straight into preallocated float32 buffers
+"""
+
+import argparse
+import json
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Model input columns, in the order the models were trained on
+FEATURE_COLUMNS = [
+    'booking_lead_days',
+    'previous_visits',
+    'travel_frequency',
+    'previous_overstays',
+    'cash_amount',
+    'high_risk_country',
+    'arrival_month',
+    'arrival_day_of_week',
+    'is_weekend',
+    'is_one_way',
+    'booking_risk_score',
+    'visit_overstay_ratio',
+    'cash_per_day',
+]
+COLUMN_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+# Raw passenger fields the encoder reads
+INPUT_FIELDS = [
+    'booking_lead_days', 'previous_visits', 'travel_frequency', 'previous_overstays',
+    'cash_amount', 'high_risk_country', 'arrival_date', 'ticket_type',
+]
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+@lru_cache(maxsize=8192)
+def calendar_features(arrival_date: str) -> Tuple[int, int, int]:
+    """
+    Parse an arrival date once and cache its calendar features
+
+    Args:
+        arrival_date: Date in YYYY-MM-DD format
+
+    Returns:
+        Tuple of (month, day_of_week, is_weekend)
+
+    Raises:
+        ValueError: If the date is not in YYYY-MM-DD format
+    """
+    parsed = datetime.strptime(arrival_date, DATE_FORMAT)
+    weekday = parsed.weekday()
+    return parsed.month, weekday, int(weekday >= 5)
+
+
+def passenger_columns(passengers: Sequence) -> Dict[str, np.ndarray]:
+    """
+    Gather raw passenger fields into typed column arrays
+
+    Args:
+        passengers: Objects with PassengerData attributes
+
+    Returns:
+        Dict of field name to array, covering INPUT_FIELDS
+    """
+    return {
+        'booking_lead_days': np.array([p.booking_lead_days for p in passengers], dtype=np.int64),
+        'previous_visits': np.array([p.previous_visits for p in passengers], dtype=np.int64),
+        'travel_frequency': np.array([p.travel_frequency for p in passengers], dtype=np.float64),
+        'previous_overstays': np.array([p.previous_overstays for p in passengers], dtype=np.int64),
+        'cash_amount': np.array([p.cash_amount for p in passengers], dtype=np.float64),
+        'high_risk_country': np.array([p.high_risk_country for p in passengers], dtype=bool),
+        'arrival_date': [p.arrival_date for p in passengers],
+        'ticket_type': [p.ticket_type for p in passengers],
+    }
+
+
+class FeatureEncoder:
+    """
+    Encode passengers into the model feature layout without intermediate
+    dicts or DataFrames
+
+    Each thread gets a reusable scratch matrix, so steady-state encoding
+    does not allocate a new buffer per request.
+    """
+
+    def __init__(self, dtype=np.float32):
+        """
+        Args:
+            dtype: Output dtype (the tree models evaluate in float32)
+        """
+        self.dtype = np.dtype(dtype)
+        self.columns = list(FEATURE_COLUMNS)
+        self._local = threading.local()
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    def scratch(self, n_rows: int) -> np.ndarray:
+        """
+        Thread-local buffer with at least n_rows rows
+
+        The returned view is overwritten by the next call on the same
+        thread, so callers must finish with it before encoding again.
+        """
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < n_rows:
+            buffer = np.empty((max(n_rows, 64), self.n_features), dtype=self.dtype)
+            self._local.buffer = buffer
+        return buffer[:n_rows]
+
+    def encode_into(self, passenger, out: np.ndarray) -> np.ndarray:
+        """
+        Write one passenger's features into a preallocated row
+
+        Args:
+            passenger: Object with PassengerData attributes
+            out: Row of length n_features
+
+        Returns:
+            The filled row
+        """
+        lead = passenger.booking_lead_days
+        visits = passenger.previous_visits
+        overstays = passenger.previous_overstays
+        cash = passenger.cash_amount
+        month, weekday, weekend = calendar_features(passenger.arrival_date)
+
+        out[0] = lead
+        out[1] = visits
+        out[2] = passenger.travel_frequency
+        out[3] = overstays
+        out[4] = cash
+        out[5] = 1 if passenger.high_risk_country else 0
+        out[6] = month
+        out[7] = weekday
+        out[8] = weekend
+        out[9] = 1 if passenger.ticket_type == 'one_way' else 0
+        out[10] = min(100, (365 - lead) / 3.65)
+        out[11] = overstays / max(1, visits)
+        out[12] = cash / max(1, lead)
+        return out
+
+    def encode(self, passenger) -> np.ndarray:
+        """Encode one passenger into this thread's scratch row (shape (1, n_features))"""
+        row = self.scratch(1)
+        self.encode_into(passenger, row[0])
+        return row
+
+    def encode_columns(self, columns: Dict[str, np.ndarray], out: np.ndarray = None) -> np.ndarray:
+        """
+        Encode raw column arrays into a feature matrix
+
+        Args:
+            columns: Raw fields as returned by passenger_columns(); an
+                optional 'calendar' entry, (month, day_of_week, is_weekend)
+                shared by every row, replaces the per-row date lookups
+            out: Optional preallocated (n_rows, n_features) matrix
+
+        Returns:
+            Feature matrix in FEATURE_COLUMNS order
+        """
+        lead = np.asarray(columns['booking_lead_days'], dtype=np.float64)
+        visits = np.asarray(columns['previous_visits'], dtype=np.float64)
+        overstays = np.asarray(columns['previous_overstays'], dtype=np.float64)
+        cash = np.asarray(columns['cash_amount'], dtype=np.float64)
+        if out is None:
+            out = np.empty((len(lead), self.n_features), dtype=self.dtype)
+
+        calendar = columns.get('calendar')
+        if calendar is None:
+            calendar = np.array([calendar_features(d) for d in columns['arrival_date']],
+                                dtype=np.int64).reshape(-1, 3)
+
+        out[:, 0] = lead
+        out[:, 1] = visits
+        out[:, 2] = columns['travel_frequency']
+        out[:, 3] = overstays
+        out[:, 4] = cash
+        out[:, 5] = columns['high_risk_country']
+        out[:, 6:9] = calendar
+        out[:, 9] = np.asarray(columns['ticket_type'], dtype=object) == 'one_way'
+        out[:, 10] = np.minimum(100, (365 - lead) / 3.65)
+        out[:, 11] = overstays / np.maximum(1, visits)
+        out[:, 12] = cash / np.maximum(1, lead)
+        return out
+
+    def encode_batch(self, passengers: Sequence, out: np.ndarray = None) -> np.ndarray:
+        """Encode a list of passengers into a feature matrix"""
+        return self.encode_columns(passenger_columns(passengers), out)
+
+    def to_frame(self, matrix: np.ndarray) -> pd.DataFrame:
+        """Wrap a feature matrix with column names (no copy) for library models"""
+        return pd.DataFrame(matrix, columns=self.columns, copy=False)
+
+
+def compare_with_reference(encoder: FeatureEncoder, passengers: List,
+                           reference: Callable) -> Dict[str, float]:
+    """
+    Check the encoder column by column against a reference implementation
+
+    Args:
+        encoder: Encoder under test
+        passengers: Sample passengers
+        reference: Function mapping one passenger to a one-row DataFrame
+            (e.g. api.engineer_features)
+
+    Returns:
+        Maximum absolute difference per column, after casting the reference
+        to the encoder dtype as the models do
+    """
+    expected = pd.concat([reference(p) for p in passengers], ignore_index=True)
+    if list(expected.columns) != encoder.columns:
+        raise ValueError(f"Column layout differs: {list(expected.columns)} != {encoder.columns}")
+    expected = expected.to_numpy(dtype=np.float64).astype(encoder.dtype)
+
+    batch = encoder.encode_batch(passengers)
+    rows = np.vstack([encoder.encode_into(p, np.empty(encoder.n_features, encoder.dtype)) for p in passengers])
+
+    return {
+        column: float(max(np.abs(batch[:, j] - expected[:, j]).max(), np.abs(rows[:, j] - expected[:, j]).max()))
+        for j, column in enumerate(encoder.columns)
+    }
+
+
+if __name__ == "__main__":
+    import random
+    from api import PassengerData, engineer_features
+
+    parser = argparse.ArgumentParser(description="Verify FeatureEncoder against engineer_features")
+    parser.add_argument('--samples', type=int, default=10000, help="Random passengers to compare")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    example = PassengerData.Config.schema_extra['example']
+    passengers = [
+        PassengerData(**{
+            **example,
+            'passenger_id': f"P{i:09d}",
+            'arrival_date': f"{rng.randint(2024, 2027)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'booking_lead_days': rng.randint(0, 365),
+            'ticket_type': rng.choice(['one_way', 'return', 'multi_city']),
+            'previous_visits': rng.randint(0, 50),
+            'travel_frequency': rng.uniform(0, 12),
+            'previous_overstays': rng.choice([0, 0, 0, 1, 2, 5]),
+            'high_risk_country': rng.random() < 0.2,
+            'cash_amount': rng.uniform(0, 50000),
+        })
+        for i in range(args.samples)
+    ]
+
+    diffs = compare_with_reference(FeatureEncoder(), passengers, engineer_features)
+    print(json.dumps(diffs, indent=2))
+    if any(diffs.values()):
+        raise SystemExit("FeatureEncoder output differs from engineer_features")
+    print(f"FeatureEncoder matches engineer_features on all {len(FEATURE_COLUMNS)} columns "
+          f"for {args.samples} passengers")
@@ -0,0 +1,36 @@
+"""
+UK Border Anomaly Detection - Gunicorn Configuration
+Runs the API as several uvicorn workers sharing the host's CPUs by the
+thread layout (see thread_layout.py):
+
+    THREAD_LAYOUT=1 WEB_CONCURRENCY=4 gunicorn -c gunicorn_conf.py api:app
+"""
+
+import os
+
+from thread_layout import ThreadLayout
+
+LAYOUT = ThreadLayout.from_env()
+
+# Set in the master, so every worker and its inference processes inherit them
+LAYOUT.configure_native_threads()
+os.environ['THREAD_LAYOUT_CPUS'] = ','.join(str(cpu) for cpu in LAYOUT.cpus)
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+workers = LAYOUT.workers
+worker_class = 'uvicorn.workers.UvicornWorker'
+# Model loading and warm-up happen in each worker before it serves
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def pre_fork(server, worker):
+    """Give a new worker the first CPU block no live worker holds (restarts reuse freed blocks)"""
+    taken = {getattr(live, 'cpu_slot', None) for live in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    """Record the worker's slot for the API's layout report and pin it if THREAD_AFFINITY is set"""
+    os.environ['THREAD_LAYOUT_SLOT'] = str(worker.cpu_slot)
+    if LAYOUT.enabled and LAYOUT.affinity:
+        LAYOUT.pin(worker.cpu_slot)
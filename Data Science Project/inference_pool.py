@@ -0,0 +1,166 @@
+"""
+UK Border Anomaly Detection - Inference Worker Pool
+Runs CPU-bound feature engineering and model calls off the asyncio event loop
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_KINDS = ('thread', 'process')
+
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[Any, float, List[metrics.Sample]]:
+    """
+    Run fn in the worker and report how long it kept the worker busy
+
+    Metric observations made by fn are returned rather than applied, so
+    they reach the API process from process-pool workers as well.
+    """
+    start = time.perf_counter()
+    with metrics.collect() as samples:
+        result = fn(*args)
+    return result, time.perf_counter() - start, samples
+
+
+class InferencePool:
+    """
+    Bounded thread or process pool for inference work
+
+    At most ``max_concurrency`` calls are handed to the executor at once;
+    further callers wait on the event loop without blocking it.
+    """
+
+    def __init__(self, kind: str = 'thread', max_workers: int = None,
+                 max_concurrency: int = None, initializer: Callable = None):
+        """
+        Args:
+            kind: 'thread' or 'process'
+            max_workers: Executor size (defaults to the CPU count)
+            max_concurrency: Maximum calls in the executor at once
+                (defaults to max_workers)
+            initializer: Run once in each worker process (process pools only),
+                e.g. to load models
+        """
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Pool kind must be one of {POOL_KINDS}, got '{kind}'")
+
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.max_workers
+        self._initializer = initializer
+
+        self._executor: Executor = None
+        self._semaphore: asyncio.Semaphore = None
+
+        self.started_at = time.monotonic()
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, initializer: Callable = None, max_workers: int = None) -> 'InferencePool':
+        """
+        Build a pool from environment variables
+
+        INFERENCE_POOL        thread (default) or process
+        INFERENCE_WORKERS     executor size (default: max_workers, else CPU count)
+        INFERENCE_MAX_CONCURRENCY  calls in flight (default: INFERENCE_WORKERS)
+        """
+        workers = os.environ.get('INFERENCE_WORKERS')
+        concurrency = os.environ.get('INFERENCE_MAX_CONCURRENCY')
+        return cls(
+            kind=os.environ.get('INFERENCE_POOL', 'thread'),
+            max_workers=int(workers) if workers else max_workers,
+            max_concurrency=int(concurrency) if concurrency else None,
+            initializer=initializer
+        )
+
+    def _ensure_started(self):
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=self._initializer
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='inference'
+                )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.started_at = time.monotonic()
+            logger.info(f"Started {self.kind} inference pool "
+                        f"(workers={self.max_workers}, max_concurrency={self.max_concurrency})")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Run fn(*args) on the pool and await its result
+
+        For process pools fn and args must be picklable.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds += time.perf_counter() - queued_at
+
+        self.active += 1
+        try:
+            result, busy, samples = await loop.run_in_executor(self._executor, _timed_call, fn, args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+        metrics.apply(samples)
+        self.completed += 1
+        self.busy_seconds += busy
+        return result
+
+    async def drain(self, poll_interval: float = 0.01):
+        """Shut down once the calls already running or queued have finished"""
+        while self.active or self.waiting:
+            await asyncio.sleep(poll_interval)
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+    def shutdown(self):
+        """Stop the executor, waiting for running calls to finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info(f"Stopped {self.kind} inference pool")
+
+    def stats(self) -> Dict:
+        """Pool size, occupancy and utilization since start"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        calls = self.completed + self.failed
+        return {
+            'kind': self.kind,
+            'workers': self.max_workers,
+            'max_concurrency': self.max_concurrency,
+            'cpu_count': os.cpu_count(),
+            'active': self.active,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'failed': self.failed,
+            'busy_seconds': self.busy_seconds,
+            # Share of total worker capacity spent running inference
+            'utilization': min(1.0, self.busy_seconds / (elapsed * self.max_workers)),
+            'mean_wait_ms': (self.wait_seconds / calls * 1000) if calls else 0.0
+        }
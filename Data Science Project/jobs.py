@@ -0,0 +1,400 @@
+"""
+UK Border Anomaly Detection - Bulk Scoring Jobs
+Score whole passenger files in the background: chunks run on a process
+pool, results land in Parquet, and progress is kept in an on-disk manifest
+so interrupted jobs resume where they stopped
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import columnar
+from inference_pool import InferencePool
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+
+# States a restarted server picks up again
+RESUMABLE_STATES = ('queued', 'running')
+
+# Text columns that pandas would otherwise parse as numbers or dates
+_CSV_DTYPES = {'passenger_id': str, 'arrival_date': str}
+
+_READ_BLOCK = 1 << 24
+
+
+def detect_format(path: str) -> str:
+    """'parquet' for files with the Parquet magic bytes, otherwise 'csv'"""
+    with open(path, 'rb') as f:
+        return 'parquet' if f.read(4) == b'PAR1' else 'csv'
+
+
+def count_rows(path: str, fmt: str) -> int:
+    """
+    Number of data rows in an input file
+
+    Parquet reads the footer; CSV counts line breaks in large binary blocks
+    (passenger extracts have no quoted newlines), without parsing.
+    """
+    if fmt == 'parquet':
+        return columnar.pq.ParquetFile(path).metadata.num_rows
+
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(_READ_BLOCK)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def iter_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[Tuple[int, object]]:
+    """
+    Read an input file as numbered Arrow tables of ``chunk_size`` rows
+
+    Chunk numbers depend only on the file and the chunk size, so a resumed
+    job maps chunks to the same result parts.
+    """
+    if fmt == 'parquet':
+        source = columnar.pq.ParquetFile(path)
+        for index, batch in enumerate(source.iter_batches(batch_size=chunk_size)):
+            yield index, columnar.pa.Table.from_batches([batch])
+        return
+
+    import pandas as pd
+    for index, frame in enumerate(pd.read_csv(path, chunksize=chunk_size, dtype=_CSV_DTYPES)):
+        yield index, columnar.pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def score_chunk(score_table: Callable, table, model_name: str, part_path: str, record: bool) -> Dict:
+    """
+    Score one chunk and write its results (runs in a pool worker)
+
+    The part is written to a temporary file and renamed, so a part on disk
+    is always complete.
+
+    Args:
+        score_table: Function (table, model_name, record) -> (results, valid, rows)
+        table: Input chunk as a pyarrow.Table
+        model_name: Model to score with
+        part_path: Parquet file for the results
+        record: Whether scored arrivals are added to the passenger history
+
+    Returns:
+        Chunk summary (rows, valid rows, anomalies)
+    """
+    results, n_valid, n_rows = score_table(table, model_name, record)
+    staging = f"{part_path}.tmp"
+    columnar.pq.write_table(results, staging)
+    os.replace(staging, part_path)
+
+    anomalies = results.column('is_anomaly').fill_null(False).to_numpy(zero_copy_only=False)
+    return {'rows': n_rows, 'valid': n_valid, 'anomalies': int(anomalies.sum())}
+
+
+class JobManager:
+    """
+    Runs bulk scoring jobs and tracks them on disk
+
+    Each job has a directory under ``root`` holding ``manifest.json`` and a
+    ``results/`` folder with one Parquet part per input chunk (readable as
+    one dataset with pyarrow or pandas). The manifest is rewritten after
+    every finished chunk; on startup, jobs that were queued or running are
+    resumed and skip the chunks already recorded.
+
+    Each run gets its own process pool, so bulk chunks never queue ahead of
+    online requests on the API's inference pool, and a job keeps the model
+    versions that were served when it started.
+    """
+
+    def __init__(self, root: str, score_table: Callable, initializer: Callable = None,
+                 workers: int = None, max_running: int = 1):
+        """
+        Args:
+            root: Directory holding one subdirectory per job
+            score_table: Picklable function (table, model_name, record) ->
+                (results table, valid rows, rows), e.g. api.score_table
+            initializer: Run once in each worker process (e.g. api.load_models)
+            workers: Processes per running job (defaults to half the CPUs)
+            max_running: Jobs scored at the same time; others wait queued
+        """
+        self.root = root
+        self.score_table = score_table
+        self.initializer = initializer
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_running = max_running
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: asyncio.Semaphore = None
+
+    @classmethod
+    def from_env(cls, score_table: Callable, initializer: Callable = None) -> 'JobManager':
+        """
+        Build a manager from environment variables
+
+        JOBS_DIR          job directory (default: jobs)
+        JOB_WORKERS       processes per running job (default: half the CPUs)
+        JOB_MAX_RUNNING   jobs scored at the same time (default: 1)
+        """
+        workers = os.environ.get('JOB_WORKERS')
+        return cls(
+            root=os.environ.get('JOBS_DIR', 'jobs'),
+            score_table=score_table,
+            initializer=initializer,
+            workers=int(workers) if workers else None,
+            max_running=int(os.environ.get('JOB_MAX_RUNNING', '1'))
+        )
+
+    # Manifest storage
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def _part_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self.job_dir(job_id), 'results', f"part-{index:05d}.parquet")
+
+    def read_manifest(self, job_id: str) -> Optional[Dict]:
+        path = os.path.join(self.job_dir(job_id), 'manifest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict):
+        manifest['updated_at'] = datetime.now().isoformat()
+        path = os.path.join(self.job_dir(manifest['job_id']), 'manifest.json')
+        staging = f"{path}.tmp"
+        with open(staging, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(staging, path)
+
+    def job_ids(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, 'manifest.json')))
+
+    # Job lifecycle
+
+    def new_job_id(self) -> str:
+        """Time-ordered unique job id"""
+        return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    async def submit(self, input_path: str, model_name: str, chunk_size: int,
+                     record_arrivals: bool = False, job_id: str = None) -> Dict:
+        """
+        Create a job for an input file and start it
+
+        Args:
+            input_path: CSV or Parquet file with PassengerData columns
+            model_name: Model to score with
+            chunk_size: Rows per chunk (and per result part)
+            record_arrivals: Add scored arrivals to the passenger history
+            job_id: Id to use (e.g. the directory an upload was saved to)
+
+        Returns:
+            The job's initial manifest
+        """
+        job_id = job_id or self.new_job_id()
+        os.makedirs(os.path.join(self.job_dir(job_id), 'results'), exist_ok=True)
+        manifest = {
+            'job_id': job_id,
+            'status': 'queued',
+            'input_path': os.path.abspath(input_path),
+            'input_format': detect_format(input_path),
+            'model_name': model_name,
+            'chunk_size': chunk_size,
+            'record_arrivals': record_arrivals,
+            'results_path': os.path.abspath(os.path.join(self.job_dir(job_id), 'results')),
+            'total_rows': None,
+            'total_chunks': None,
+            'chunks': {},
+            'runs': [],
+            'error': None,
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        self._write_manifest(manifest)
+        self._start(job_id)
+        logger.info(f"Submitted job {job_id}: {input_path} with {model_name}")
+        return manifest
+
+    def _start(self, job_id: str):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        task = asyncio.ensure_future(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_all(self) -> List[str]:
+        """Restart every job that was queued or running when the server stopped"""
+        resumed = []
+        for job_id in self.job_ids():
+            manifest = self.read_manifest(job_id)
+            if manifest['status'] in RESUMABLE_STATES and job_id not in self._tasks:
+                self._start(job_id)
+                resumed.append(job_id)
+        if resumed:
+            logger.info(f"Resuming jobs {resumed}")
+        return resumed
+
+    def resume(self, job_id: str) -> Dict:
+        """Restart a failed or cancelled job from its last finished chunk"""
+        manifest = self.read_manifest(job_id)
+        if job_id not in self._tasks and manifest['status'] != 'completed':
+            manifest['status'] = 'queued'
+            manifest['error'] = None
+            self._write_manifest(manifest)
+            self._start(job_id)
+        return manifest
+
+    async def cancel(self, job_id: str) -> Dict:
+        """Stop a job; its finished parts are kept and it can be resumed"""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        manifest = self.read_manifest(job_id)
+        if manifest['status'] in RESUMABLE_STATES:
+            manifest['status'] = 'cancelled'
+            self._write_manifest(manifest)
+        return manifest
+
+    async def stop(self):
+        """
+        Interrupt running jobs on shutdown
+
+        Their manifests stay 'queued' or 'running', so the next start
+        resumes them.
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            manifest = self.read_manifest(job_id)
+            manifest['status'] = 'running'
+            manifest['runs'].append({'started_at': datetime.now().isoformat(),
+                                     'chunks_done': len(manifest['chunks'])})
+            self._write_manifest(manifest)
+
+            pool = InferencePool('process', self.workers, initializer=self.initializer)
+            try:
+                if manifest['total_rows'] is None:
+                    rows = await loop.run_in_executor(
+                        None, count_rows, manifest['input_path'], manifest['input_format']
+                    )
+                    manifest['total_rows'] = rows
+                    manifest['total_chunks'] = -(-rows // manifest['chunk_size'])
+                    self._write_manifest(manifest)
+
+                await self._score_chunks(manifest, pool)
+
+                manifest['status'] = 'completed'
+                manifest['finished_at'] = datetime.now().isoformat()
+                self._write_manifest(manifest)
+                logger.info(f"Job {job_id} completed ({manifest['total_rows']} rows)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                manifest['status'] = 'failed'
+                manifest['error'] = str(e)
+                manifest['finished_at'] = datetime.now().isoformat()
+                self._write_manifest(manifest)
+            finally:
+                await pool.drain()
+
+    async def _score_chunks(self, manifest: Dict, pool: InferencePool):
+        """Read chunks off the event loop and keep the pool busy with the unfinished ones"""
+        loop = asyncio.get_running_loop()
+        job_id = manifest['job_id']
+        reader = iter_chunks(manifest['input_path'], manifest['input_format'], manifest['chunk_size'])
+
+        async def score(index: int, table):
+            summary = await pool.run(
+                score_chunk, self.score_table, table, manifest['model_name'],
+                self._part_path(job_id, index), manifest['record_arrivals']
+            )
+            manifest['chunks'][str(index)] = summary
+            self._write_manifest(manifest)
+
+        pending = set()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, reader, None)
+                if chunk is None:
+                    break
+                index, table = chunk
+                if str(index) in manifest['chunks'] and os.path.exists(self._part_path(job_id, index)):
+                    continue
+
+                pending.add(asyncio.ensure_future(score(index, table)))
+                # Read ahead only as far as the pool can take, to bound memory
+                if len(pending) >= pool.max_concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # Reporting
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """
+        Progress of a job
+
+        Returns:
+            Manifest summary with row counts, completion and throughput,
+            or None if there is no such job
+        """
+        manifest = self.read_manifest(job_id)
+        if manifest is None:
+            return None
+
+        chunks = manifest['chunks'].values()
+        rows_done = sum(chunk['rows'] for chunk in chunks)
+        total = manifest['total_rows']
+
+        rate = eta = None
+        if manifest['runs'] and manifest['status'] == 'running':
+            run = manifest['runs'][-1]
+            elapsed = (datetime.now() - datetime.fromisoformat(run['started_at'])).total_seconds()
+            done_this_run = len(manifest['chunks']) - run['chunks_done']
+            if elapsed > 0 and done_this_run:
+                rate = done_this_run * manifest['chunk_size'] / elapsed
+                if total is not None:
+                    eta = max(total - rows_done, 0) / rate
+
+        return {
+            **{key: value for key, value in manifest.items() if key not in ('chunks', 'runs')},
+            'active': job_id in self._tasks,
+            'runs': len(manifest['runs']),
+            'chunks_done': len(manifest['chunks']),
+            'rows_done': rows_done,
+            'progress': round(rows_done / total, 4) if total else (1.0 if total == 0 else None),
+            'valid_rows': sum(chunk['valid'] for chunk in chunks),
+            'anomalies': sum(chunk['anomalies'] for chunk in chunks),
+            'rows_per_second': round(rate, 1) if rate else None,
+            'eta_seconds': round(eta, 1) if eta is not None else None
+        }
@@ -0,0 +1,316 @@
+"""
+UK Border Anomaly Detection - Metrics
+Per-stage latency histograms and counters in the Prometheus text format
+"""
+
+import abc
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Container, Dict, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# Seconds; fine resolution at the low end where single predictions land
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# A buffered observation: (metric name, label values, value)
+Sample = Tuple[str, Tuple[str, ...], float]
+
+
+class Metric(abc.ABC):
+    """Base class for labelled metrics held in the process-wide REGISTRY"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _labels(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    @abc.abstractmethod
+    def observe_values(self, label_values: Tuple[str, ...], value: float):
+        """Add a value to the series with these label values"""
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Lines of the Prometheus text format for this metric"""
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        record(self.name, self._labels(labels), amount)
+
+    def observe_values(self, label_values: Tuple[str, ...], value: float):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(values)} {_number(total)}" for values, total in items]
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        record(self.name, self._labels(labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def observe_values(self, label_values: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+
+        lines = []
+        for values, series in items:
+            cumulative = 0
+            bounds = [_number(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{self._format_labels(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(values)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._format_labels(values)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+REGISTRY: Dict[str, Metric] = {}
+
+# Observations made inside inference workers are buffered and handed back
+# with the call result (see inference_pool._timed_call), so process pools
+# report into the API process too
+_local = threading.local()
+
+
+def record(name: str, label_values: Tuple[str, ...], value: float):
+    """Apply an observation here, or buffer it while collect() is active"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.append((name, label_values, value))
+    else:
+        REGISTRY[name].observe_values(label_values, value)
+
+
+@contextmanager
+def collect():
+    """Buffer observations made on this thread; yields the list they go to"""
+    previous = getattr(_local, 'pending', None)
+    _local.pending = samples = []
+    try:
+        yield samples
+    finally:
+        _local.pending = previous
+
+
+def apply(samples: Sequence[Sample]):
+    """Apply observations buffered by collect(), e.g. in another process"""
+    for name, label_values, value in samples:
+        REGISTRY[name].observe_values(label_values, value)
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = Histogram(
+    'border_api_stage_seconds',
+    'Latency of each request stage (validation and serialization per request, '
+    'the other stages per model call)',
+    ['stage', 'model']
+)
+REQUEST_SECONDS = Histogram(
+    'border_api_request_seconds',
+    'End-to-end request latency',
+    ['method', 'route', 'status']
+)
+BATCH_SIZE = Histogram(
+    'border_api_batch_size',
+    'Passengers scored per model call',
+    ['model'],
+    buckets=BATCH_SIZE_BUCKETS
+)
+PASSENGERS_SCORED = Counter(
+    'border_api_passengers_scored_total',
+    'Passengers scored, by model and risk level',
+    ['model', 'risk_level']
+)
+
+
+# Model names a `model` label may take (the API registers its model table);
+# any other name is recorded as 'unknown', so clients cannot create series
+_known_models: Container = frozenset()
+
+
+def register_models(models: Container):
+    """Set the model names allowed as `model` label values (a live container is fine)"""
+    global _known_models
+    _known_models = models
+
+
+def model_label(model_name: Optional[str]) -> str:
+    """`model` label value for a requested model name"""
+    return model_name if model_name in _known_models else 'unknown'
+
+
+class RequestTiming:
+    """Timestamps of one request, shared between the middleware and its endpoint"""
+
+    __slots__ = ('start', 'handler_started', 'handler_done', 'model')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.handler_started = None
+        self.handler_done = None
+        self.model = None
+
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar('request_timing', default=None)
+
+
+def timed_endpoint(endpoint: Callable) -> Callable:
+    """
+    Decorate an async prediction endpoint to record its stage timings
+
+    Time from the request's arrival to the endpoint call is recorded as the
+    validation stage (body read and schema validation), labelled with the
+    ``model_name`` argument ('multiple' for endpoints without one, 'unknown'
+    for names that are not registered models). Calls
+    made from another endpoint (e.g. the per-passenger batch fallback) are
+    not timed again.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        timing = _current_request.get()
+        if timing is None or timing.handler_started is not None:
+            return await endpoint(*args, **kwargs)
+
+        timing.handler_started = time.perf_counter()
+        model_name = kwargs.get('model_name')
+        timing.model = model_label(model_name) if model_name else 'multiple'
+        STAGE_SECONDS.observe(timing.handler_started - timing.start, stage='validation', model=timing.model)
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timing.handler_done = time.perf_counter()
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording end-to-end latency per route
+
+    The gap between a timed endpoint returning and the response starting is
+    recorded as that request's serialization stage.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current_request.set(timing)
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status_code[0] = message['status']
+                if timing.handler_done is not None:
+                    STAGE_SECONDS.observe(time.perf_counter() - timing.handler_done,
+                                          stage='serialization', model=timing.model)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - timing.start,
+                method=scope['method'], route=_route_template(scope), status=status_code[0]
+            )
+
+
+def _route_template(scope) -> str:
+    """Path template of the matched route, so label values stay bounded"""
+    app = scope.get('app')
+    for route in getattr(app, 'routes', ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
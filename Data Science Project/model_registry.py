@@ -0,0 +1,135 @@
+"""
+UK Border Anomaly Detection - Model Registry
+Versioned model slots with background loading, warm-up and atomic swaps
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Publishes loaded scorers into a shared name -> scorer mapping
+
+    A new version is loaded and warmed up off to the side while the current
+    one keeps serving. It is then published with a single dict assignment,
+    so requests that already hold the old scorer finish on it and every
+    later lookup sees the new one. A version that fails to load or warm up
+    is never published.
+    """
+
+    def __init__(self, models: Dict, loader: Callable, warmup: Callable = None,
+                 version_of: Callable = None, history_size: int = 5):
+        """
+        Args:
+            models: Mapping the API reads scorers from (e.g. api.MODELS)
+            loader: Function name -> scorer (or None if there is no artifact)
+            warmup: Function scorer -> None, run before a scorer is published;
+                should raise if the scorer gives unusable output
+            version_of: Function name -> version of the artifact on disk, used
+                to detect retrained models without loading them
+            history_size: Previously served versions remembered per model
+        """
+        self.models = models
+        self.loader = loader
+        self.warmup = warmup
+        self.version_of = version_of
+        self.history_size = history_size
+
+        self.records: Dict[str, Dict] = {}
+        self.history: Dict[str, List[Dict]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def publish(self, name: str, scorer, warmup_ms: float = None) -> Dict:
+        """Make scorer the served version of a model and record it"""
+        previous = self.records.get(name)
+        record = {
+            'version': scorer.version,
+            'loaded_at': datetime.now().isoformat(),
+            'warmup_ms': round(warmup_ms, 3) if warmup_ms is not None else None,
+            'pid': os.getpid()
+        }
+        self.models[name] = scorer
+        self.records[name] = record
+        if previous is not None:
+            self.history.setdefault(name, []).insert(0, previous)
+            del self.history[name][self.history_size:]
+        return record
+
+    def reload(self, name: str, force: bool = False) -> Dict:
+        """
+        Load, warm up and publish the current artifact of a model
+
+        Blocking; run it off the event loop. Concurrent reloads of the same
+        model are serialized.
+
+        Args:
+            name: Model to reload
+            force: Reload even if the artifact version has not changed
+
+        Returns:
+            Dict with the outcome ('reloaded', 'unchanged' or 'missing') and versions
+        """
+        with self._lock_for(name):
+            current = self.models.get(name)
+            if not force and current is not None and self.version_of is not None:
+                if self.version_of(name) == current.version:
+                    return {'model': name, 'status': 'unchanged', 'version': current.version}
+
+            start = time.perf_counter()
+            scorer = self.loader(name)
+            if scorer is None:
+                return {'model': name, 'status': 'missing',
+                        'version': current.version if current is not None else None}
+            load_ms = (time.perf_counter() - start) * 1000
+
+            warmup_ms = None
+            if self.warmup is not None:
+                start = time.perf_counter()
+                self.warmup(scorer)
+                warmup_ms = (time.perf_counter() - start) * 1000
+
+            record = self.publish(name, scorer, warmup_ms)
+            logger.info(f"Swapped {name} to version {scorer.version} "
+                        f"(load {load_ms:.1f} ms, warm-up {warmup_ms or 0:.1f} ms)")
+            return {
+                'model': name,
+                'status': 'reloaded',
+                'version': scorer.version,
+                'previous_version': current.version if current is not None else None,
+                'load_ms': round(load_ms, 3),
+                **record
+            }
+
+    def stale(self) -> List[str]:
+        """Registry-loaded models whose artifact on disk differs from the served version"""
+        if self.version_of is None:
+            return []
+        stale = []
+        for name in list(self.records):
+            scorer = self.models[name]
+            try:
+                if self.version_of(name) != scorer.version:
+                    stale.append(name)
+            except OSError:
+                # Artifact is mid-replacement; check again next time
+                continue
+        return stale
+
+    def info(self, name: str) -> Dict:
+        """Served version of a model and the versions it replaced"""
+        return {
+            **self.records.get(name, {}),
+            'previous_versions': [record['version'] for record in self.history.get(name, [])]
+        }
@@ -0,0 +1,338 @@
+"""
+UK Border Anomaly Detection - Passenger History Index
+Persistent per-passenger travel history for the behavioural features
+"""
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing.util
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Behavioural fields the index can supply
+HISTORY_FIELDS = ('previous_visits', 'travel_frequency', 'previous_overstays')
+
+# SQLite caps bound parameters per statement (999 on older builds); lookups
+# are chunked below it
+_LOOKUP_CHUNK = 300
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# One row per passenger and arrival date: re-screening the same trip
+# (check-in, pre-clearance, arrival) does not add a visit, and features are
+# counted from the arrivals before the screened one whatever order they were
+# recorded in
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS arrivals (
+        passenger_id TEXT NOT NULL,
+        arrival_date TEXT NOT NULL,
+        PRIMARY KEY (passenger_id, arrival_date)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS overstays (
+        passenger_id TEXT PRIMARY KEY,
+        overstays    INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+)
+
+_RECORD_ARRIVAL = """
+INSERT OR IGNORE INTO arrivals (passenger_id, arrival_date) VALUES (?, ?)
+"""
+
+_RECORD_OVERSTAYS = """
+INSERT INTO overstays (passenger_id, overstays) VALUES (?, ?)
+ON CONFLICT (passenger_id) DO UPDATE SET overstays = overstays + excluded.overstays
+"""
+
+# Earlier arrivals of each (row, passenger_id, arrival_date) query row: a range
+# scan of the primary key per passenger
+_EARLIER_ARRIVALS = """
+WITH query (row, passenger_id, arrival_date) AS (VALUES {values})
+SELECT query.row, count(arrivals.arrival_date), min(arrivals.arrival_date), overstays.overstays
+FROM query
+LEFT JOIN arrivals ON arrivals.passenger_id = query.passenger_id
+                  AND arrivals.arrival_date < query.arrival_date
+LEFT JOIN overstays ON overstays.passenger_id = query.passenger_id
+GROUP BY query.row
+"""
+
+
+@lru_cache(maxsize=8192)
+def normalize_date(arrival_date: str) -> str:
+    """
+    Zero-padded ISO form of an arrival date
+
+    The API accepts what strptime accepts (e.g. 2026-1-5); dates are stored,
+    compared and looked up in ISO form so that string order is date order.
+
+    Raises:
+        ValueError: If the date is not in YYYY-MM-DD format
+    """
+    return datetime.strptime(arrival_date, DATE_FORMAT).date().isoformat()
+
+
+class PassengerHistory:
+    """
+    Embedded passenger-history index keyed by passenger_id
+
+    Backed by a SQLite file in WAL mode: primary-key lookups are B-tree
+    probes (microseconds at tens of millions of passengers), several API
+    workers on one host can read while one writes, and the index survives
+    restarts. Each thread uses its own connection.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA mmap_size=268435456')
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, passenger_ids: Sequence[str], arrival_dates: Sequence[str]) -> List[Tuple[int, Optional[str], int]]:
+        """
+        Raw history of each passenger as of an arrival
+
+        Args:
+            passenger_ids: Passengers to look up
+            arrival_dates: Arrival being screened (YYYY-MM-DD), aligned with the ids
+
+        Returns:
+            One (earlier_visits, first_arrival, overstays) tuple per passenger,
+            counting only arrivals before the screened one; first_arrival is
+            None when there are none
+        """
+        connection = self._connection()
+        passenger_ids = list(passenger_ids)
+        dates = [normalize_date(arrival_date) for arrival_date in arrival_dates]
+        rows = []
+        for start in range(0, len(dates), _LOOKUP_CHUNK):
+            chunk = list(zip(passenger_ids[start:start + _LOOKUP_CHUNK], dates[start:start + _LOOKUP_CHUNK]))
+            records = {row: (visits, first_arrival, overstays or 0)
+                       for row, visits, first_arrival, overstays in connection.execute(
+                           _EARLIER_ARRIVALS.format(values=','.join(['(?, ?, ?)'] * len(chunk))),
+                           [value for row, query in enumerate(chunk) for value in (row, *query)])}
+            rows.extend(records[row] for row in range(len(chunk)))
+        return rows
+
+    def features(self, passenger_ids: Sequence[str], arrival_dates: Sequence[str]) -> List[Tuple[int, float, int]]:
+        """
+        Behavioural features as of each arrival
+
+        Args:
+            passenger_ids: Passengers to look up
+            arrival_dates: Arrival being screened (YYYY-MM-DD), aligned with the ids
+
+        Returns:
+            One (previous_visits, travel_frequency, previous_overstays) tuple
+            per passenger; unknown passengers are first-time visitors
+        """
+        return [history_features(record, normalize_date(arrival_date))
+                for record, arrival_date in zip(self.lookup(passenger_ids, arrival_dates), arrival_dates)]
+
+    def record_arrivals(self, passenger_ids: Sequence[str], arrival_dates: Sequence[str]):
+        """Add arrivals in one transaction (repeat screenings of a trip are ignored)"""
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(_RECORD_ARRIVAL, (
+                (p, normalize_date(d)) for p, d in zip(passenger_ids, arrival_dates)
+            ))
+
+    def record_overstays(self, passenger_ids: Sequence[str], counts: Sequence[int] = None):
+        """Add overstays (e.g. from departure records)"""
+        counts = counts if counts is not None else [1] * len(passenger_ids)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(_RECORD_OVERSTAYS, ((p, int(c)) for p, c in zip(passenger_ids, counts) if c))
+
+    def stats(self) -> Dict:
+        connection = self._connection()
+        (passengers, arrivals), = connection.execute(
+            'SELECT count(DISTINCT passenger_id), count(*) FROM arrivals'
+        ).fetchall()
+        return {'path': self.path, 'passengers': passengers, 'arrivals': arrivals}
+
+
+class ArrivalRecorder:
+    """
+    Background writer of scored arrivals
+
+    The request path only appends to a bounded in-memory queue; a daemon
+    thread records whatever is queued in one transaction per flush, so no
+    request waits on a SQLite write. When the queue is full, new arrivals
+    are dropped and counted rather than blocking. Queued arrivals are
+    flushed when the process exits, including inference pool processes.
+    """
+
+    def __init__(self, history: PassengerHistory, max_queue: int = 100000, flush_interval: float = 0.5):
+        """
+        Args:
+            history: Index the arrivals are recorded in
+            max_queue: Arrivals held in memory before new ones are dropped
+            flush_interval: Seconds between flushes
+        """
+        self.history = history
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+
+        self._queue = collections.deque()
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._overflowed = False
+
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, passenger_ids: Sequence[str], arrival_dates: Sequence[str]) -> int:
+        """
+        Queue arrivals for recording (non-blocking)
+
+        Returns:
+            Number of arrivals accepted
+        """
+        self._ensure_started()
+        with self._condition:
+            room = max(0, self.max_queue - self._queued)
+            accepted = min(len(passenger_ids), room)
+            if accepted < len(passenger_ids):
+                if not self._overflowed:
+                    self._overflowed = True
+                    logger.warning(f"Arrival queue full ({self.max_queue}), dropping arrivals")
+                self.dropped += len(passenger_ids) - accepted
+            if accepted:
+                self._queue.append((list(passenger_ids[:accepted]), list(arrival_dates[:accepted])))
+                self._queued += accepted
+        return accepted
+
+    def _ensure_started(self):
+        # A forked process inherits the object but not the thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._closing = False
+                    self._thread = threading.Thread(target=self._run, name='arrival-recorder', daemon=True)
+                    self._thread.start()
+                    # Runs at interpreter exit, and at exit of multiprocessing children
+                    multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def close(self, timeout: float = 30.0):
+        """Record everything queued and stop the writer"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closing:
+                    self._condition.wait(self.flush_interval)
+                chunks = list(self._queue)
+                self._queue.clear()
+                self._queued = 0
+                # The queue has room again: the next overflow is a new episode to warn about
+                self._overflowed = False
+                closing = self._closing
+            if chunks:
+                passenger_ids = [p for ids, _ in chunks for p in ids]
+                arrival_dates = [d for _, dates in chunks for d in dates]
+                try:
+                    self.history.record_arrivals(passenger_ids, arrival_dates)
+                    self.recorded += len(passenger_ids)
+                except Exception as e:
+                    self.failed += len(passenger_ids)
+                    logger.error(f"Recording {len(passenger_ids)} arrivals failed: {str(e)}")
+            if closing:
+                return
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self._queued,
+            'max_queue': self.max_queue,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+def history_features(record: Tuple[int, Optional[str], int], arrival_date: str) -> Tuple[int, float, int]:
+    """
+    Derive (previous_visits, travel_frequency, previous_overstays) for one arrival
+
+    record holds the arrivals before the screened one (see
+    PassengerHistory.lookup), so a trip that was already recorded, or later
+    trips when an older arrival is rescored, are not counted.
+    travel_frequency is those visits per year since the first of them,
+    counting at least one year.
+    """
+    previous, first_arrival, overstays = record
+    if previous <= 0:
+        return 0, 0.0, overstays
+
+    years = (date.fromisoformat(arrival_date) - date.fromisoformat(first_arrival)).days / 365.25
+    return previous, previous / max(1.0, years), overstays
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build or query the passenger history index")
+    parser.add_argument('--db', default='data/passenger_history.sqlite3')
+    parser.add_argument('--import-csv', help="Arrivals CSV with passenger_id, arrival_date "
+                                             "and an optional overstayed (0/1) column")
+    parser.add_argument('--chunksize', type=int, default=200000)
+    parser.add_argument('--lookup', nargs='*', help="passenger_id[:arrival_date] to look up")
+    args = parser.parse_args()
+
+    history = PassengerHistory(args.db)
+    if args.import_csv:
+        start = time.perf_counter()
+        for chunk in pd.read_csv(args.import_csv, chunksize=args.chunksize, dtype={'passenger_id': str}):
+            history.record_arrivals(chunk['passenger_id'].tolist(), chunk['arrival_date'].astype(str).tolist())
+            if 'overstayed' in chunk:
+                history.record_overstays(chunk['passenger_id'].tolist(), chunk['overstayed'].fillna(0).tolist())
+        logger.info(f"Imported {args.import_csv} in {time.perf_counter() - start:.1f}s")
+
+    for query in args.lookup or []:
+        passenger_id, _, arrival_date = query.partition(':')
+        arrival_date = arrival_date or date.today().isoformat()
+        print(json.dumps({'passenger_id': passenger_id, 'arrival_date': arrival_date,
+                          **dict(zip(HISTORY_FIELDS, history.features([passenger_id], [arrival_date])[0]))}))
+    print(json.dumps(history.stats()))
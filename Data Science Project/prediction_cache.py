@@ -0,0 +1,136 @@
+"""
+UK Border Anomaly Detection - Prediction Cache
+In-process LRU cache with TTL for repeat screenings of unchanged passengers
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of per-passenger model outputs with expiry
+
+    Entries are keyed on (model name, model version, digest of the engineered
+    feature row), so a passenger re-screened with unchanged inputs skips the
+    model while any change to the inputs or the model misses. Safe to share
+    between inference threads; each worker process keeps its own cache.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+                (0 disables the cache)
+            ttl_seconds: Age after which an entry is treated as a miss
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> 'PredictionCache':
+        """
+        Build a cache from environment variables
+
+        PREDICTION_CACHE_SIZE  maximum entries (default 10000, 0 disables)
+        PREDICTION_CACHE_TTL   entry lifetime in seconds (default 300)
+        """
+        return cls(
+            max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+            ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def keys(model_name: str, version: str, features: np.ndarray) -> List[Tuple]:
+        """
+        Cache keys for each row of a feature matrix
+
+        Args:
+            model_name: Registry name of the model
+            version: Version of the loaded model artifact
+            features: Engineered feature matrix (one row per passenger)
+
+        Returns:
+            One hashable key per row
+        """
+        rows = np.ascontiguousarray(features)
+        return [
+            (model_name, version, hashlib.blake2b(row.tobytes(), digest_size=16).digest())
+            for row in rows
+        ]
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Tuple]]:
+        """Look up keys, returning the cached value or None for each"""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values.append(entry[1])
+        return values
+
+    def put_many(self, keys: Sequence[Hashable], values: Sequence[Tuple]):
+        """Store values, evicting least recently used entries over the bound"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the models are reloaded)"""
+        with self._lock:
+            if self._entries:
+                logger.info(f"Invalidating {len(self._entries)} cached predictions")
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Size, hit rate and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,162 @@
+"""
+UK Border Anomaly Detection - Model Scoring
+Single-pass scoring wrappers for the models served by the API
+"""
+
+import abc
+
+import numpy as np
+from typing import Dict, NamedTuple
+
+# Risk levels, highest threshold first
+RISK_THRESHOLDS = [(0.8, "CRITICAL"), (0.6, "HIGH"), (0.4, "MEDIUM")]
+# All risk levels, lowest first
+RISK_LEVELS = ["LOW"] + [level for _, level in reversed(RISK_THRESHOLDS)]
+
+
+def assign_risk_levels(anomaly_scores: np.ndarray) -> np.ndarray:
+    """Map anomaly scores to risk level labels"""
+    return np.select(
+        [anomaly_scores >= threshold for threshold, _ in RISK_THRESHOLDS],
+        [level for _, level in RISK_THRESHOLDS],
+        default="LOW"
+    )
+
+
+class ScoreResult(NamedTuple):
+    """Per-passenger outputs of one scoring pass (arrays aligned with the input rows)"""
+    is_anomaly: np.ndarray
+    anomaly_score: np.ndarray
+    confidence: np.ndarray
+    risk_level: np.ndarray
+
+
+class ModelScorer(abc.ABC):
+    """
+    Base wrapper around a loaded model
+
+    Subclasses run the model exactly once per call and derive every
+    output from that single raw score.
+    """
+
+    def __init__(self, name: str, model, config: Dict = None, compiled=None, version: str = None):
+        """
+        Args:
+            name: Registry name of the model (e.g. 'ensemble')
+            model: Fitted estimator loaded from disk
+            config: Serving options for this model (see MODEL_CONFIG in api.py)
+            compiled: Optional compiled tree evaluator (see tree_compiler.py)
+                used for batches of up to ``compiled_max_rows`` rows
+            version: Identifies the loaded artifact (e.g. for cache keys)
+        """
+        self.name = name
+        self.model = model
+        self.config = dict(config or {})
+        self.compiled = compiled
+        self._version = version or 'unversioned'
+        self.compiled_max_rows = self.config.get('compiled_max_rows') or 0
+        # Per-prediction explanations (tree_shap.TreeExplainer), attached on load
+        self.explainer = None
+
+    @property
+    def version(self) -> str:
+        """Identifies the loaded artifact"""
+        return self._version
+
+    @property
+    def model_type(self) -> str:
+        """Class name of the wrapped estimator"""
+        return type(self.model).__name__
+
+    def estimator_for(self, n_rows: int):
+        """
+        Pick the evaluator for a batch
+
+        The compiled evaluator has less per-call overhead, while the
+        library model is faster on large batches.
+        """
+        if self.compiled is not None and n_rows <= self.compiled_max_rows:
+            return self.compiled
+        return self.model
+
+    @abc.abstractmethod
+    def raw_scores(self, features) -> np.ndarray:
+        """Run the underlying model once"""
+
+    @abc.abstractmethod
+    def from_raw(self, raw: np.ndarray) -> ScoreResult:
+        """Derive label, score, confidence and risk level from raw model output"""
+
+    def score(self, features) -> ScoreResult:
+        """
+        Score a feature matrix
+
+        Args:
+            features: Engineered features (one row per passenger)
+
+        Returns:
+            ScoreResult with one entry per row
+        """
+        return self.from_raw(self.raw_scores(features))
+
+
+class ProbabilityScorer(ModelScorer):
+    """Scorer for supervised classifiers exposing predict_proba"""
+
+    def raw_scores(self, features) -> np.ndarray:
+        return self.estimator_for(len(features)).predict_proba(features)
+
+    def from_raw(self, probabilities: np.ndarray) -> ScoreResult:
+        # Same label predict() would return, without a second pass over the trees
+        best = probabilities.argmax(axis=1)
+        classes = getattr(self.model, 'classes_', None)
+        labels = np.asarray(classes)[best] if classes is not None else best
+
+        anomaly_scores = probabilities[:, 1] if probabilities.shape[1] > 1 else probabilities[:, 0]
+        return ScoreResult(
+            is_anomaly=(labels == 1) | (labels == -1),
+            anomaly_score=anomaly_scores,
+            confidence=probabilities.max(axis=1),
+            risk_level=assign_risk_levels(anomaly_scores)
+        )
+
+
+class OutlierScorer(ModelScorer):
+    """Scorer for unsupervised outlier detectors (e.g. IsolationForest)"""
+
+    def raw_scores(self, features) -> np.ndarray:
+        return self.estimator_for(len(features)).score_samples(features)
+
+    def from_raw(self, raw: np.ndarray) -> ScoreResult:
+        anomaly_scores = np.abs(raw)
+        return ScoreResult(
+            is_anomaly=self._outlier_mask(raw),
+            anomaly_score=anomaly_scores,
+            confidence=np.minimum(1.0, anomaly_scores / 2),
+            risk_level=assign_risk_levels(anomaly_scores)
+        )
+
+    def _outlier_mask(self, raw: np.ndarray) -> np.ndarray:
+        # predict() flags samples whose decision function (score - offset_) is negative
+        return (raw - self.model.offset_) < 0
+
+
+def make_scorer(name: str, model, config: Dict = None, compiled=None, version: str = None) -> ModelScorer:
+    """
+    Wrap a loaded model in the matching scorer
+
+    Args:
+        name: Registry name of the model
+        model: Fitted estimator (or a CompiledForest used on its own)
+        config: Serving options for this model
+        compiled: Optional CompiledForest for small batches
+        version: Identifies the loaded artifact
+
+    Returns:
+        ModelScorer for the model
+    """
+    if hasattr(model, 'predict_proba'):
+        return ProbabilityScorer(name, model, config, compiled, version)
+    if hasattr(model, 'score_samples') and hasattr(model, 'offset_'):
+        return OutlierScorer(name, model, config, compiled, version)
+    raise TypeError(f"Unsupported model type for '{name}': {type(model).__name__}")
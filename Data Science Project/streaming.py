@@ -0,0 +1,103 @@
+"""
+UK Border Anomaly Detection - NDJSON Streaming
+Incremental newline-delimited JSON parsing for large passenger manifests
+"""
+
+import json
+from typing import Any, AsyncIterator, List, Tuple
+
+from starlette.responses import StreamingResponse
+
+# A parsed line: (1-based line number, decoded object or the decode error)
+ParsedLine = Tuple[int, Any]
+
+
+async def ndjson_batches(byte_stream: AsyncIterator[bytes], max_batch: int = 1000,
+                         first_batch: int = 64,
+                         max_line_bytes: int = 1 << 20) -> AsyncIterator[List[ParsedLine]]:
+    """
+    Group NDJSON lines from a byte stream into batches
+
+    Only the current partial line and one batch are held in memory.
+    Batch sizes start at ``first_batch`` and double up to ``max_batch``,
+    so the first results go out quickly while later batches amortize the
+    per-call model overhead.
+
+    Args:
+        byte_stream: Async iterator of body chunks (e.g. Request.stream())
+        max_batch: Largest batch to yield
+        first_batch: Size of the first batch
+        max_line_bytes: Longest accepted line; longer lines are skipped and
+            reported with a ValueError, so a response already under way
+            is not cut short
+
+    Yields:
+        Lists of (line_number, object) pairs; undecodable lines carry the
+        ValueError instead of an object
+    """
+    target = max(1, min(first_batch, max_batch))
+    batch: List[ParsedLine] = []
+    pending = b''
+    line_number = 0
+
+    def parse(raw: bytes):
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            return ValueError(f"Invalid JSON: {str(e)}")
+
+    too_long = ValueError(f"Line exceeds {max_line_bytes} bytes")
+    # Inside an over-long line that was already reported: drop it up to its newline
+    skipping = False
+
+    async for chunk in byte_stream:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+
+        for raw in lines:
+            if skipping:
+                skipping = False
+                continue
+            line_number += 1
+            if len(raw) > max_line_bytes:
+                batch.append((line_number, too_long))
+            elif raw.strip():
+                batch.append((line_number, parse(raw)))
+            if len(batch) >= target:
+                yield batch
+                batch = []
+                target = min(target * 2, max_batch)
+
+        if skipping:
+            pending = b''
+        elif len(pending) > max_line_bytes:
+            line_number += 1
+            batch.append((line_number, too_long))
+            pending = b''
+            skipping = True
+
+    if pending.strip():
+        line_number += 1
+        batch.append((line_number, parse(pending)))
+    if batch:
+        yield batch
+
+
+def ndjson_lines(records: List[dict]) -> str:
+    """Serialize records as NDJSON (one object per line, trailing newline)"""
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that can be sent while the request body is still being read
+
+    The stock response listens for client disconnects by calling receive()
+    concurrently, which would swallow body chunks the generator has not
+    read yet. A disconnect instead surfaces as a send error, ending the stream.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,39 @@
+"""
+UK Border Anomaly Detection - Synthetic Passengers
+Reproducible passenger payloads for load tests, cascade tuning and warm-up
+"""
+
+import random
+from typing import Dict, List
+
+
+def synthetic_passengers(count: int, seed: int = 0) -> List[Dict]:
+    """
+    Generate passenger payloads with every PassengerData field set
+
+    Args:
+        count: Number of passengers
+        seed: Random seed, so runs send identical traffic
+
+    Returns:
+        List of JSON-ready passenger dicts
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            'passenger_id': f"B{i:09d}",
+            'arrival_port': rng.choice(['LHR', 'LGW', 'MAN', 'STN', 'EDI']),
+            'arrival_date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'origin_country': rng.choice(['United States', 'France', 'India', 'Nigeria', 'Brazil']),
+            'booking_lead_days': rng.randint(0, 365),
+            'ticket_type': rng.choice(['one_way', 'return', 'multi_city']),
+            'previous_visits': rng.randint(0, 50),
+            'travel_frequency': round(rng.uniform(0, 12), 2),
+            'previous_overstays': rng.choice([0, 0, 0, 1, 2, 5]),
+            'high_risk_country': rng.random() < 0.2,
+            'cash_amount': round(rng.uniform(0, 20000), 2),
+            'age': rng.randint(18, 80),
+            'gender': rng.choice(['M', 'F']),
+        }
+        for i in range(count)
+    ]
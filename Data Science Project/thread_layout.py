@@ -0,0 +1,248 @@
+"""
+UK Border Anomaly Detection - Thread Layout
+Coordinates worker processes, inference threads, model n_jobs and native
+(OpenMP/BLAS) thread pools so several API workers do not oversubscribe a host
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Read when the libraries load: OpenMP (XGBoost, scikit-learn), OpenBLAS, MKL,
+# BLIS, Accelerate and numexpr
+NATIVE_THREAD_VARS = (
+    'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS',
+)
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on (its affinity mask where the OS has one)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def os_thread_count() -> int:
+    """Threads of this process, including native pools Python does not know about"""
+    try:
+        return len(os.listdir('/proc/self/task'))
+    except OSError:
+        return threading.active_count()
+
+
+def native_thread_pools() -> List[Dict]:
+    """Native thread pools loaded in this process and their sizes (needs threadpoolctl)"""
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        return []
+    return [
+        {key: pool.get(key) for key in ('user_api', 'internal_api', 'num_threads', 'prefix')}
+        for pool in threadpool_info()
+    ]
+
+
+def set_model_threads(model, n_jobs: int):
+    """
+    Set the prediction threads of a library model
+
+    XGBoost boosters get nthread as well as n_jobs; voting and stacking
+    ensembles have their members set. Models without n_jobs (e.g. a
+    CompiledForest, which evaluates in NumPy) are left as they are.
+    """
+    for member in getattr(model, 'named_estimators_', {}).values():
+        set_model_threads(member, n_jobs)
+    if not hasattr(model, 'n_jobs'):
+        return
+    if hasattr(model, 'get_booster'):
+        model.set_params(n_jobs=n_jobs)
+        try:
+            model.get_booster().set_param({'nthread': n_jobs})
+        except ValueError:
+            # Not fitted: nothing to predict with yet
+            pass
+    else:
+        model.n_jobs = n_jobs
+
+
+def model_n_jobs(model) -> Optional[object]:
+    """n_jobs of a library model (per member for ensembles), None if it has none"""
+    members = getattr(model, 'named_estimators_', None)
+    if members:
+        return {name: model_n_jobs(member) for name, member in members.items()}
+    return getattr(model, 'n_jobs', None)
+
+
+class ThreadLayout:
+    """
+    Thread budget of one API worker process on a shared host
+
+    The host's CPUs are split evenly between ``workers`` processes. Within a
+    worker, each model call gets ``model_threads`` threads (model n_jobs and
+    the native OpenMP/BLAS pools), and the inference pool runs as many calls
+    at once as fit in the worker's share. So the host runs about one busy
+    thread per CPU, however many workers it has. With ``affinity``, each
+    worker is also pinned to its own contiguous block of CPUs
+    (gunicorn_conf.py assigns the blocks).
+    """
+
+    def __init__(self, enabled: bool = False, workers: int = 1, model_threads: int = 1,
+                 affinity: bool = False, cpus: List[int] = None):
+        """
+        Args:
+            enabled: Apply the layout (when off, it is only reported)
+            workers: API worker processes on this host
+            model_threads: Threads per model call
+            affinity: Pin each worker to its CPU block
+            cpus: CPUs to share out (defaults to this process's affinity mask)
+        """
+        self.enabled = enabled
+        self.workers = max(1, workers)
+        self.model_threads = max(1, model_threads)
+        self.affinity = affinity
+        self.cpus = list(cpus) if cpus is not None else available_cpus()
+        self.worker_slot = None
+
+    @classmethod
+    def from_env(cls) -> 'ThreadLayout':
+        """
+        Build the layout from environment variables
+
+        THREAD_LAYOUT     1 to coordinate thread pools (default off)
+        WEB_CONCURRENCY   API worker processes on this host, as passed to
+                          uvicorn/gunicorn (default 1)
+        MODEL_THREADS     threads per model call (default 1)
+        THREAD_AFFINITY   1 to pin each worker to its CPU block
+
+        gunicorn_conf.py also passes each worker the host CPU list
+        (THREAD_LAYOUT_CPUS) and its slot (THREAD_LAYOUT_SLOT), since a
+        pinned worker only sees its own block.
+        """
+        def flag(name: str) -> bool:
+            return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+        cpus = os.environ.get('THREAD_LAYOUT_CPUS')
+        slot = os.environ.get('THREAD_LAYOUT_SLOT')
+        layout = cls(
+            enabled=flag('THREAD_LAYOUT'),
+            workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+            model_threads=int(os.environ.get('MODEL_THREADS', 1)),
+            affinity=flag('THREAD_AFFINITY'),
+            cpus=[int(cpu) for cpu in cpus.split(',')] if cpus else None
+        )
+        layout.worker_slot = int(slot) if slot else None
+        return layout
+
+    @property
+    def threads_per_worker(self) -> int:
+        """CPUs available to each worker process"""
+        return max(1, len(self.cpus) // self.workers)
+
+    @property
+    def pool_workers(self) -> int:
+        """Concurrent model calls that fill a worker's share without oversubscribing it"""
+        return max(1, self.threads_per_worker // self.model_threads)
+
+    def worker_cpus(self, slot: int) -> List[int]:
+        """Contiguous block of CPUs for a worker slot"""
+        size = self.threads_per_worker
+        start = (slot % self.workers) * size
+        return self.cpus[start:start + size]
+
+    def configure_native_threads(self):
+        """
+        Size the native thread pools of libraries not loaded yet
+
+        Variables already set in the environment are kept. Inference
+        processes started later inherit the settings.
+        """
+        if not self.enabled:
+            return
+        for var in NATIVE_THREAD_VARS:
+            os.environ.setdefault(var, str(self.model_threads))
+
+    def limit_loaded_pools(self):
+        """Resize native pools that were already loaded (BLAS mainly), if threadpoolctl is installed"""
+        if not self.enabled:
+            return
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return
+        threadpool_limits(limits=self.model_threads)
+
+    def pin(self, slot: int):
+        """Restrict this process to the CPU block of a worker slot"""
+        cpus = self.worker_cpus(slot)
+        self.worker_slot = slot
+        if not hasattr(os, 'sched_setaffinity'):
+            logger.warning("CPU affinity is not supported on this platform")
+            return
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Pinned worker {os.getpid()} (slot {slot}) to CPUs {cpus}")
+
+    def apply_to_model(self, model):
+        """Give a library model ``model_threads`` prediction threads"""
+        if self.enabled:
+            set_model_threads(model, self.model_threads)
+        return model
+
+    def describe(self, models: Dict = None, pool=None) -> Dict:
+        """
+        Effective thread layout of this process
+
+        Args:
+            models: Optional name -> ModelScorer mapping, for per-model n_jobs
+            pool: Optional InferencePool, for its size
+
+        Returns:
+            Planned budget next to what the process actually runs with
+        """
+        report = {
+            'enabled': self.enabled,
+            'pid': os.getpid(),
+            'host_cpus': os.cpu_count(),
+            'workers': self.workers,
+            'threads_per_worker': self.threads_per_worker,
+            'model_threads': self.model_threads,
+            'affinity': self.affinity,
+            'worker_slot': self.worker_slot,
+            'cpus': available_cpus(),
+            'native_env': {var: os.environ.get(var) for var in NATIVE_THREAD_VARS},
+            'native_pools': native_thread_pools(),
+            'os_threads': os_thread_count(),
+        }
+        if pool is not None:
+            report['inference_pool'] = {'kind': pool.kind, 'workers': pool.max_workers}
+        if models is not None:
+            report['model_n_jobs'] = {
+                name: model_n_jobs(scorer.model) for name, scorer in models.items()
+                if hasattr(scorer, 'model')
+            }
+        return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Show the thread layout for a worker count")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)))
+    parser.add_argument('--model-threads', type=int, default=int(os.environ.get('MODEL_THREADS', 1)))
+    args = parser.parse_args()
+
+    layout = ThreadLayout(enabled=True, workers=args.workers, model_threads=args.model_threads)
+    print(json.dumps({
+        'cpus': len(layout.cpus),
+        'workers': layout.workers,
+        'threads_per_worker': layout.threads_per_worker,
+        'model_threads': layout.model_threads,
+        'inference_pool_workers': layout.pool_workers,
+        'worker_cpus': {slot: layout.worker_cpus(slot) for slot in range(layout.workers)},
+        'env': {var: str(layout.model_threads) for var in NATIVE_THREAD_VARS},
+    }, indent=2))
@@ -0,0 +1,565 @@
+"""
+UK Border Anomaly Detection - Compiled Tree Ensembles
+Flattens random forest, XGBoost and isolation forest models into contiguous
+NumPy arrays, stores them as memory-mappable artifacts and evaluates them
+with vectorized traversal
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Arrays stored per compiled ensemble (one entry per node across all trees)
+NODE_ARRAYS = ['feature', 'threshold', 'children', 'default_left', 'value', 'cover']
+
+ARTIFACT_META = 'meta.json'
+
+
+class CompiledForest:
+    """
+    Tree ensemble stored as flat node arrays
+
+    Node ``i`` splits on ``feature[i]`` at ``threshold[i]`` and continues at
+    ``children[i, 0]`` (left) or ``children[i, 1]`` (right); NaN inputs
+    follow ``default_left[i]``. Leaves point to themselves, so every row can
+    be advanced a fixed number of levels without branching. ``value`` holds
+    the per-leaf class distribution (random forest), margin (XGBoost) or
+    path length (isolation forest), and ``cover`` the training weight that
+    reached each node.
+
+    Artifacts are saved as one ``.npy`` file per array so that every worker
+    process can memory-map them read-only and share a single physical copy
+    through the page cache. Nothing derived from the node arrays is kept
+    per instance.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        """
+        Args:
+            arrays: Node arrays (see NODE_ARRAYS) plus 'roots'
+            meta: Ensemble description (kind, feature_names, classes,
+                max_depth, base_margin, offset)
+        """
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.default_left = arrays['default_left']
+        self.value = arrays['value']
+        self.cover = arrays['cover']
+        self.roots = arrays['roots']
+
+        self.meta = meta
+        self.kind = meta['kind']
+        self.feature_names = meta['feature_names']
+        self.feature_names_in_ = np.asarray(self.feature_names, dtype=object)
+        self.classes_ = np.asarray(meta.get('classes', []))
+        self.max_depth = meta['max_depth']
+        self.base_margin = meta.get('base_margin', 0.0)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.children[:, 0]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.children[:, 1]
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.left == np.arange(len(self.children))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _as_matrix(self, X) -> np.ndarray:
+        """Order columns like the training data and cast to float32 as the libraries do"""
+        if hasattr(X, 'columns'):
+            # Frames already in training order (e.g. from FeatureEncoder) are not reindexed
+            X = X.to_numpy() if list(X.columns) == self.feature_names else X[self.feature_names].to_numpy()
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Find the leaf each row reaches in each tree
+
+        Args:
+            X: Feature matrix or DataFrame
+
+        Returns:
+            Array of node indices with shape (n_rows, n_trees)
+        """
+        X = self._as_matrix(X)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        # Offset of each row in flat_X, so one gather reads every (row, feature) pair
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        check_missing = bool(np.isnan(flat_X).any())
+        strict = self.kind == 'xgboost'
+
+        nodes = np.broadcast_to(self.roots.astype(np.intp), (n_rows, self.n_trees))
+        for _ in range(self.max_depth):
+            values = flat_X[row_offsets + self.feature[nodes]]
+            thresholds = self.threshold[nodes]
+            go_right = values >= thresholds if strict else values > thresholds
+            if check_missing:
+                missing = np.isnan(values)
+                go_right = np.where(missing, ~self.default_left[nodes], go_right)
+            nodes = self.children[nodes, go_right.view(np.int8)]
+
+        return nodes
+
+    def predict_margin(self, X) -> np.ndarray:
+        """
+        Raw ensemble output: mean class distribution (RF), summed margin
+        (XGBoost) or summed path length (isolation forest)
+        """
+        leaves = self.apply(X)
+        if self.kind == 'random_forest':
+            return self.value[leaves].mean(axis=1)
+        return self.base_margin + self.value[leaves, 0].sum(axis=1)
+
+    def save(self, path: str):
+        """
+        Write the ensemble as an artifact directory of raw .npy files
+
+        The directory is built next to ``path`` and renamed into place, so
+        readers never see a partially written artifact.
+        """
+        staging = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        arrays = {name: getattr(self, name) for name in NODE_ARRAYS + ['roots']}
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(staging, ARTIFACT_META), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CompiledForest':
+        """
+        Open an artifact directory
+
+        Args:
+            path: Directory written by save()
+            mmap: Memory-map the arrays read-only instead of reading them
+
+        Returns:
+            CompiledForest backed by the artifact files
+        """
+        mmap_mode = 'r' if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in NODE_ARRAYS + ['roots']
+        }
+        with open(os.path.join(path, ARTIFACT_META)) as f:
+            meta = json.load(f)
+        return COMPILED_KINDS[meta['kind']](arrays, meta)
+
+
+class CompiledClassifier(CompiledForest):
+    """Compiled random forest or XGBoost classifier"""
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities with the same layout as the source model"""
+        output = self.predict_margin(X)
+        if self.kind == 'xgboost':
+            positive = 1.0 / (1.0 + np.exp(-output))
+            return np.column_stack([1.0 - positive, positive])
+        return output
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class CompiledIsolationForest(CompiledForest):
+    """Compiled IsolationForest; leaf values are the path lengths sklearn assigns"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        super().__init__(arrays, meta)
+        self.offset_ = meta['offset']
+
+    def score_samples(self, X) -> np.ndarray:
+        """Anomaly score as in IsolationForest.score_samples (lower is more abnormal)"""
+        depths = self.predict_margin(X)
+        denominator = self.n_trees * self.meta['average_path_length']
+        if denominator == 0:
+            return -np.ones_like(depths)
+        return -(2 ** (-depths / denominator))
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.score_samples(X) - self.offset_ < 0, -1, 1)
+
+
+COMPILED_KINDS = {
+    'random_forest': CompiledClassifier,
+    'xgboost': CompiledClassifier,
+    'isolation_forest': CompiledIsolationForest
+}
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray, root: int = 0) -> int:
+    """Depth of a tree given local child arrays (-1 marks a leaf)"""
+    depth, frontier = 0, [root]
+    while True:
+        frontier = [child for node in frontier for child in (left[node], right[node]) if child >= 0]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def _concat_trees(trees: List[Dict], meta: Dict) -> CompiledForest:
+    """Stack per-tree arrays (local indices, -1 children for leaves) into one ensemble"""
+    parts = {name: [] for name in NODE_ARRAYS}
+    roots, offset, max_depth = [], 0, 0
+    if not trees:
+        raise ValueError("Cannot compile an ensemble without trees")
+
+    for tree in trees:
+        n_nodes = len(tree['left'])
+        local = np.arange(n_nodes)
+        leaf = tree['left'] < 0
+
+        parts['feature'].append(np.where(leaf, 0, tree['feature']).astype(np.int32))
+        parts['threshold'].append(np.where(leaf, 0, tree['threshold']))
+        parts['children'].append(np.column_stack([
+            np.where(leaf, local, tree['left']),
+            np.where(leaf, local, tree['right'])
+        ]).astype(np.int32) + offset)
+        parts['default_left'].append(tree['default_left'].astype(bool))
+        parts['value'].append(tree['value'])
+        parts['cover'].append(tree['cover'].astype(np.float64))
+
+        roots.append(offset)
+        max_depth = max(max_depth, _tree_depth(tree['left'], tree['right']))
+        offset += n_nodes
+
+    arrays = {name: np.ascontiguousarray(np.concatenate(values)) for name, values in parts.items()}
+    arrays['roots'] = np.array(roots, dtype=np.int32)
+    meta['max_depth'] = max_depth
+    return COMPILED_KINDS[meta['kind']](arrays, meta)
+
+
+def compile_random_forest(model) -> CompiledForest:
+    """
+    Flatten a fitted sklearn RandomForestClassifier
+
+    Args:
+        model: Fitted RandomForestClassifier
+
+    Returns:
+        CompiledForest with per-leaf class distributions
+    """
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :].astype(np.float64)
+        # Older sklearn stores class counts; predict_proba normalizes per leaf
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+        missing_left = getattr(tree, 'missing_go_to_left', None)
+        trees.append({
+            'feature': tree.feature,
+            'threshold': tree.threshold.astype(np.float64),
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'default_left': (
+                np.asarray(missing_left) if missing_left is not None
+                else np.zeros(tree.node_count, dtype=bool)
+            ),
+            'value': value,
+            'cover': tree.weighted_n_node_samples
+        })
+
+    meta = {
+        'kind': 'random_forest',
+        'feature_names': [str(name) for name in model.feature_names_in_],
+        'classes': model.classes_.tolist()
+    }
+    return _concat_trees(trees, meta)
+
+
+def compile_xgboost(model) -> CompiledForest:
+    """
+    Flatten a fitted binary:logistic XGBClassifier
+
+    Args:
+        model: Fitted XGBClassifier
+
+    Returns:
+        CompiledForest with per-leaf margins
+    """
+    learner = json.loads(model.get_booster().save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    booster = learner['gradient_booster']
+    if objective != 'binary:logistic' or booster['name'] != 'gbtree':
+        raise ValueError(f"Only gbtree binary:logistic models can be compiled, got {booster['name']} {objective}")
+
+    raw_trees = booster['model']['trees']
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        # predict_proba stops at the early-stopping round
+        raw_trees = raw_trees[:best_iteration + 1]
+
+    trees = []
+    for raw in raw_trees:
+        if any(raw['split_type']):
+            raise ValueError("Categorical splits are not supported")
+        left = np.array(raw['left_children'], dtype=np.int64)
+        conditions = np.array(raw['split_conditions'], dtype=np.float32)
+        trees.append({
+            'feature': np.array(raw['split_indices'], dtype=np.int64),
+            'threshold': conditions,
+            'left': left,
+            'right': np.array(raw['right_children'], dtype=np.int64),
+            'default_left': np.array(raw['default_left'], dtype=bool),
+            # Leaves keep their output in split_conditions
+            'value': np.where(left < 0, conditions, 0).astype(np.float64)[:, None],
+            'cover': np.array(raw['sum_hessian'], dtype=np.float64)
+        })
+
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    feature_names = learner.get('feature_names') or [
+        f"f{i}" for i in range(int(learner['learner_model_param']['num_feature']))
+    ]
+    meta = {
+        'kind': 'xgboost',
+        'feature_names': feature_names,
+        'classes': np.asarray(getattr(model, 'classes_', [0, 1])).tolist(),
+        'base_margin': float(np.log(base_score / (1.0 - base_score)))
+    }
+    forest = _concat_trees(trees, meta)
+    # XGBoost compares float32 features against float32 thresholds
+    forest.threshold = forest.threshold.astype(np.float32)
+    return forest
+
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected path length of an unsuccessful BST search over n samples (as in sklearn)"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    result[large] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return result
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Depth of every node (root = 0) given local child arrays"""
+    depths = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        # sklearn numbers children after their parent
+        for child in (left[node], right[node]):
+            if child >= 0:
+                depths[child] = depths[node] + 1
+    return depths
+
+
+def compile_isolation_forest(model) -> CompiledForest:
+    """
+    Flatten a fitted sklearn IsolationForest
+
+    Each leaf stores the path length sklearn credits to samples landing
+    there: nodes on the path plus the average path length of the samples
+    the leaf still holds, minus one.
+
+    Args:
+        model: Fitted IsolationForest
+
+    Returns:
+        CompiledIsolationForest
+    """
+    n_features = model.n_features_in_
+    max_samples = getattr(model, '_max_samples', None) or model.max_samples_
+
+    trees = []
+    for estimator, features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        # Trees fitted on a feature subset index into that subset
+        feature = tree.feature if len(features) == n_features else np.asarray(features)[np.maximum(tree.feature, 0)]
+        path_length = (_node_depths(tree.children_left, tree.children_right) + 1
+                       + _average_path_length(tree.n_node_samples) - 1.0)
+        missing_left = getattr(tree, 'missing_go_to_left', None)
+        trees.append({
+            'feature': feature,
+            'threshold': tree.threshold.astype(np.float64),
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'default_left': (
+                np.asarray(missing_left) if missing_left is not None
+                else np.zeros(tree.node_count, dtype=bool)
+            ),
+            'value': np.where(leaf, path_length, 0.0)[:, None],
+            'cover': tree.weighted_n_node_samples
+        })
+
+    feature_names = getattr(model, 'feature_names_in_', None)
+    meta = {
+        'kind': 'isolation_forest',
+        'feature_names': (
+            [str(name) for name in feature_names] if feature_names is not None
+            else [f"f{i}" for i in range(n_features)]
+        ),
+        'offset': float(model.offset_),
+        'average_path_length': float(_average_path_length([max_samples])[0])
+    }
+    return _concat_trees(trees, meta)
+
+
+def compile_model(model) -> CompiledForest:
+    """Compile a random forest, XGBoost classifier or isolation forest"""
+    compilers = {
+        'XGBClassifier': compile_xgboost,
+        'RandomForestClassifier': compile_random_forest,
+        'IsolationForest': compile_isolation_forest
+    }
+    compiler = compilers.get(type(model).__name__)
+    if compiler is None:
+        raise TypeError(f"Cannot compile model of type {type(model).__name__}")
+    return compiler(model)
+
+
+def _model_output(model, X) -> np.ndarray:
+    """The output the API scores from: probabilities or outlier scores"""
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)
+    return model.score_samples(X)
+
+
+def synthetic_features(forest: CompiledForest, n_rows: int, seed: int = 0) -> np.ndarray:
+    """Random rows spanning the split thresholds the ensemble actually uses"""
+    rng = np.random.default_rng(seed)
+    n_features = len(forest.feature_names)
+    X = np.zeros((n_rows, n_features), dtype=np.float32)
+    split = ~forest.is_leaf
+    for j in range(n_features):
+        thresholds = forest.threshold[split & (forest.feature == j)]
+        if len(thresholds):
+            low, high = float(thresholds.min()), float(thresholds.max())
+            margin = max(high - low, 1.0) * 0.1
+            X[:, j] = rng.uniform(low - margin, high + margin, n_rows)
+    return X
+
+
+def benchmark(model, forest: CompiledForest, batch_sizes=(1, 10, 100, 1000, 10000),
+              repeats: int = 20) -> List[Dict]:
+    """
+    Compare the compiled evaluator with the library model
+
+    Args:
+        model: Original fitted model
+        forest: Compiled version of the model
+        batch_sizes: Rows per call to time
+        repeats: Calls per batch size (fewer for large batches)
+
+    Returns:
+        One result dict per batch size with timings and max output difference
+    """
+    import pandas as pd
+
+    results = []
+    for size in batch_sizes:
+        X = pd.DataFrame(synthetic_features(forest, size), columns=forest.feature_names)
+        runs = max(1, repeats if size <= 1000 else repeats // 10)
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            expected = _model_output(model, X)
+        library_ms = (time.perf_counter() - start) / runs * 1000
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            actual = _model_output(forest, X)
+        compiled_ms = (time.perf_counter() - start) / runs * 1000
+
+        results.append({
+            'batch_size': size,
+            'library_ms': round(library_ms, 3),
+            'compiled_ms': round(compiled_ms, 3),
+            'speedup': round(library_ms / compiled_ms, 2) if compiled_ms else None,
+            'max_abs_diff': float(np.abs(expected - actual).max())
+        })
+    return results
+
+
+# Pickled models that can be compiled, and their artifact directories
+COMPILABLE_MODELS = {
+    'random_forest': ('random_forest_model.pkl', 'random_forest_model.arrays'),
+    'xgboost': ('xgboost_model.pkl', 'xgboost_model.arrays'),
+    'isolation_forest': ('isolation_forest_model.pkl', 'isolation_forest_model.arrays')
+}
+
+
+def export_models(models_dir: str = 'models/', tolerance: float = 1e-6,
+                  run_benchmark: bool = False) -> Dict:
+    """
+    Compile every available tree model and check it against the pickle
+
+    Args:
+        models_dir: Directory holding the pickled models
+        tolerance: Maximum allowed output difference
+        run_benchmark: Also time batch sizes 1 to 10k
+
+    Returns:
+        Export report keyed by model name
+    """
+    import joblib
+
+    report = {}
+    for name, (pickle_file, compiled_file) in COMPILABLE_MODELS.items():
+        pickle_path = os.path.join(models_dir, pickle_file)
+        if not os.path.exists(pickle_path):
+            logger.warning(f"Model file not found: {pickle_path}")
+            continue
+
+        model = joblib.load(pickle_path)
+        forest = compile_model(model)
+
+        check = benchmark(model, forest, batch_sizes=(1000,), repeats=1)[0]
+        if check['max_abs_diff'] > tolerance:
+            raise ValueError(
+                f"Compiled {name} differs from the original by {check['max_abs_diff']:.2e} "
+                f"(tolerance {tolerance:.0e})"
+            )
+
+        compiled_path = os.path.join(models_dir, compiled_file)
+        forest.save(compiled_path)
+        logger.info(f"Compiled {name}: {forest.n_trees} trees, {len(forest.feature)} nodes -> {compiled_path}")
+
+        report[name] = {
+            'path': compiled_path,
+            'trees': forest.n_trees,
+            'nodes': int(len(forest.feature)),
+            'max_depth': forest.max_depth,
+            'max_abs_diff': check['max_abs_diff']
+        }
+        if run_benchmark:
+            report[name]['benchmark'] = benchmark(model, forest)
+
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Compile tree models into memory-mappable NumPy artifacts")
+    parser.add_argument('--models-dir', default='models/', help="Directory with the pickled models")
+    parser.add_argument('--tolerance', type=float, default=1e-6, help="Maximum output difference")
+    parser.add_argument('--benchmark', action='store_true', help="Time batch sizes 1 to 10k")
+    args = parser.parse_args()
+
+    print(json.dumps(export_models(args.models_dir, args.tolerance, args.benchmark), indent=2))
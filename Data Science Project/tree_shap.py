@@ -0,0 +1,259 @@
+"""
+UK Border Anomaly Detection - Tree SHAP Explanations
+Batched path-dependent TreeSHAP over compiled tree ensembles: per-passenger
+feature contributions in a few milliseconds
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from tree_compiler import CompiledForest
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on (rows x paths x features) elements evaluated at once
+MAX_BLOCK_ELEMENTS = 1 << 21
+
+
+class PathGroup(NamedTuple):
+    """Root-to-leaf paths that split on the same number of distinct features"""
+    feature: np.ndarray        # (paths, depth) feature index
+    lower: np.ndarray          # (paths, depth) lower bound of values following the path
+    upper: np.ndarray          # (paths, depth) upper bound
+    missing_follows: np.ndarray  # (paths, depth) whether NaN follows the path
+    zero_fraction: np.ndarray  # (paths, depth) share of training cover following the path
+    value: np.ndarray          # (paths,) leaf output
+
+
+def leaf_outputs(forest: CompiledForest) -> np.ndarray:
+    """
+    Per-node output explained, oriented so that positive means more anomalous
+
+    Random forests: probability of the anomaly class averaged over trees.
+    XGBoost: margin (log-odds). Isolation forest: negated path length,
+    since short paths are anomalous.
+    """
+    if forest.kind == 'random_forest':
+        column = 1 if forest.value.shape[1] > 1 else 0
+        return forest.value[:, column] / forest.n_trees
+    if forest.kind == 'isolation_forest':
+        return -forest.value[:, 0]
+    return forest.value[:, 0]
+
+
+def decompose_paths(forest: CompiledForest):
+    """
+    Split every tree into root-to-leaf paths with per-feature conditions
+
+    Splits on the same feature along a path are merged: the value range
+    that follows all of them, and the product of their cover ratios.
+
+    Returns:
+        Tuple of (PathGroups keyed by distinct-feature count, expected value
+        of the ensemble output over the training cover)
+    """
+    outputs = leaf_outputs(forest)
+    feature, threshold = forest.feature, forest.threshold
+    children, default_left, cover = forest.children, forest.default_left, forest.cover
+    # XGBoost sends x < threshold left; sklearn sends x <= threshold left
+    strict = forest.kind == 'xgboost'
+
+    paths = {}
+    expected = 0.0
+    for root in forest.roots.tolist():
+        # Stack of (node, {feature: [lower, upper, missing_follows, zero_fraction]})
+        stack = [(root, {})]
+        while stack:
+            node, conditions = stack.pop()
+            left, right = children[node]
+            if left == node:
+                value = float(outputs[node])
+                fraction = float(np.prod([c[3] for c in conditions.values()])) if conditions else 1.0
+                expected += value * fraction
+                paths.setdefault(len(conditions), []).append((conditions, value))
+                continue
+
+            f, t = int(feature[node]), float(threshold[node])
+            for child, goes_left in ((left, True), (right, False)):
+                lower, upper, missing, zero = conditions.get(f, (-np.inf, np.inf, True, 1.0))
+                if goes_left:
+                    upper = min(upper, t)
+                else:
+                    lower = max(lower, t)
+                ratio = cover[child] / cover[node] if cover[node] > 0 else 0.0
+                branch = dict(conditions)
+                branch[f] = (lower, upper, missing and bool(default_left[node]) == goes_left, zero * ratio)
+                stack.append((child, branch))
+
+    groups = {}
+    for depth, members in paths.items():
+        if depth == 0:
+            # Single-leaf trees only shift the expected value
+            continue
+        items = [sorted(conditions.items()) for conditions, _ in members]
+        groups[depth] = PathGroup(
+            feature=np.array([[f for f, _ in item] for item in items], dtype=np.intp),
+            lower=np.array([[c[0] for _, c in item] for item in items], dtype=np.float64),
+            upper=np.array([[c[1] for _, c in item] for item in items], dtype=np.float64),
+            missing_follows=np.array([[c[2] for _, c in item] for item in items], dtype=bool),
+            zero_fraction=np.array([[c[3] for _, c in item] for item in items], dtype=np.float64),
+            value=np.array([value for _, value in members], dtype=np.float64)
+        )
+    return groups, expected + forest.base_margin * (forest.kind == 'xgboost'), strict
+
+
+def _quadrature(depth: int):
+    """Gauss-Legendre nodes and weights on [0, 1], exact for polynomials of degree depth - 1"""
+    nodes, weights = np.polynomial.legendre.leggauss(max(1, (depth + 1) // 2))
+    return (nodes + 1) / 2, weights / 2
+
+
+class TreeExplainer:
+    """
+    Path-dependent TreeSHAP for a compiled ensemble, batched over rows
+
+    Each leaf contributes v * prod_j (o_j if j in S else z_j) to the
+    conditional expectation for a feature subset S, where z_j is the share
+    of training cover following the path's conditions on feature j and o_j
+    whether the row does. Its Shapley value for feature i reduces to
+
+        v * (o_i - z_i) * integral_0^1 prod_{j != i} (z_j + (o_j - z_j) t) dt
+
+    a polynomial integral evaluated exactly by Gauss-Legendre quadrature.
+    The path decomposition is built once, when the model loads; explaining
+    a batch is a few array operations per path length.
+    """
+
+    def __init__(self, forest: CompiledForest):
+        """
+        Args:
+            forest: Compiled random forest, XGBoost or isolation forest
+        """
+        start = time.perf_counter()
+        self.kind = forest.kind
+        self.feature_names = list(forest.feature_names)
+        self._as_matrix = forest._as_matrix
+        self.groups, self.expected_value, self._strict = decompose_paths(forest)
+        self.n_paths = sum(len(group.value) for group in self.groups.values())
+        logger.info(f"Prepared TreeSHAP for {forest.kind}: {self.n_paths} paths "
+                    f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def shap_values(self, X) -> np.ndarray:
+        """
+        Feature contributions for each row
+
+        Args:
+            X: Feature matrix or DataFrame (as passed to the model)
+
+        Returns:
+            Array (n_rows, n_features); each row sums to the explained output
+            minus expected_value
+        """
+        X = self._as_matrix(X).astype(np.float64)
+        n_rows, n_features = X.shape
+        out = np.zeros(n_rows * n_features)
+
+        for depth, group in self.groups.items():
+            nodes, weights = _quadrature(depth)
+            n_paths = len(group.value)
+            rows_per_block = max(1, MAX_BLOCK_ELEMENTS // (n_paths * depth))
+            for start in range(0, n_rows, rows_per_block):
+                block = X[start:start + rows_per_block]
+                contributions = self._group_contributions(block, group, nodes, weights)
+                flat = (np.arange(start, start + len(block))[:, None, None] * n_features + group.feature)
+                out += np.bincount(flat.ravel(), weights=contributions.ravel(), minlength=len(out))
+
+        return out.reshape(n_rows, n_features)
+
+    def _group_contributions(self, X: np.ndarray, group: PathGroup, nodes: np.ndarray,
+                             weights: np.ndarray) -> np.ndarray:
+        """Shapley contributions (rows, paths, depth) of one path group"""
+        values = X[:, group.feature]
+        if self._strict:
+            follows = (values >= group.lower) & (values < group.upper)
+        else:
+            follows = (values > group.lower) & (values <= group.upper)
+        missing = np.isnan(values)
+        if missing.any():
+            follows = np.where(missing, group.missing_follows, follows)
+
+        zero = group.zero_fraction
+        slope = follows - zero
+        integral = np.zeros(values.shape)
+        for t, w in zip(nodes, weights):
+            factors = zero + slope * t
+            product = factors.prod(axis=2, keepdims=True)
+            # Leave-one-out product; a zero factor only occurs where slope is zero too
+            with np.errstate(divide='ignore', invalid='ignore'):
+                integral += w * np.where(factors != 0, product / factors, 0.0)
+        return group.value[:, None] * slope * integral
+
+    def explain(self, X, top: int = None) -> List[Dict[str, float]]:
+        """
+        Per-row contributions keyed by feature name
+
+        Args:
+            X: Feature matrix or DataFrame
+            top: Keep only the largest contributions by magnitude (None for all)
+
+        Returns:
+            One {feature: contribution} dict per row, largest magnitude first
+        """
+        phi = self.shap_values(X)
+        k = phi.shape[1] if not top else min(top, phi.shape[1])
+        order = np.argsort(-np.abs(phi), axis=1, kind='stable')[:, :k]
+        names = self.feature_names
+        return [
+            {names[j]: float(row[j]) for j in row_order}
+            for row, row_order in zip(phi, order.tolist())
+        ]
+
+
+def explainer_for(model) -> Optional[TreeExplainer]:
+    """TreeExplainer for a compiled forest or a model tree_compiler can compile, else None"""
+    from tree_compiler import compile_model
+
+    if not isinstance(model, CompiledForest):
+        try:
+            model = compile_model(model)
+        except (TypeError, ValueError):
+            return None
+    return TreeExplainer(model)
+
+
+if __name__ == "__main__":
+    from tree_compiler import synthetic_features
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Time TreeSHAP on a compiled model artifact")
+    parser.add_argument('artifact', help="Directory written by tree_compiler.py (e.g. models/xgboost_model.arrays)")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    forest = CompiledForest.load(args.artifact)
+    explainer = TreeExplainer(forest)
+    X = synthetic_features(forest, args.rows)
+
+    start = time.perf_counter()
+    phi = explainer.shap_values(X)
+    elapsed = time.perf_counter() - start
+
+    output = forest.predict_margin(X)
+    explained = output[:, 1] if forest.kind == 'random_forest' else output
+    if forest.kind == 'isolation_forest':
+        explained = -explained
+    print(json.dumps({
+        'kind': forest.kind,
+        'paths': explainer.n_paths,
+        'rows': args.rows,
+        'ms_per_row': round(elapsed * 1000 / args.rows, 4),
+        'max_additivity_error': float(np.abs(phi.sum(axis=1) + explainer.expected_value - explained).max()),
+        'example': explainer.explain(X[:1], top=args.top)[0]
+    }, indent=2))